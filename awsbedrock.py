@@ -1,14 +1,66 @@
-import boto3
-import json
+import asyncio
 import os
-import subprocess
-from typing import Dict, Any
-from s2i_builder import containerize_with_s2i, S2IBuilder
-from s2i_setup import install_s2i, check_s2i_installation
+import threading
+import time
+from typing import Dict, Any, List, Tuple, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+from command_runner import run_command, BUILD_TIMEOUT, DOCKER_CLI_TIMEOUT
+from log_store import get_log_store, tail_text
+from profiling import span
+from reclaimer import get_reclaimer, MANAGED_LABEL
+from llm_schemas import RepoAnalysis, S2IConfig, extract_json
+from build_scheduler import DOCKER_BIN, get_build_scheduler, is_host_failure
+from build_context import prune_build_context
+from buildkit_cache import build_command, cache_dir_for, cache_lock, commit_cache, CacheStatsCounter
+from resource_limits import container_run_args
+from project_layout import skip_dir, dockerfile_base_image
+from bedrock_sessions import (CACHE_POINT, BedrockSession, begin_usage, record_usage, get_session_manager,
+                              supports_cache_points, without_cache_points)
+
+# boto3, s2i_builder and s2i_setup are imported where they are used so that
+# importing this module (and main.py) stays cheap at process start.
+
+DOCKER_CHECK_TTL = float(os.getenv("DOCKER_CHECK_TTL", "60"))
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Static preamble shared by every repository conversation. It is sent as the
+# system prompt followed by a cache point so Bedrock can serve it from cache.
+SYSTEM_PROMPT = """You are a containerization assistant for a service that analyzes git repositories
+and builds container images for them, either from a Dockerfile or with Source-to-Image (S2I).
+
+The first message of a conversation describes one repository: its directory structure and,
+when available, the contents of its dependency manifests. Later messages ask for an analysis,
+a Dockerfile or an S2I configuration for that same repository.
+
+- Base every answer on the files shown; do not invent files or dependencies.
+- Prefer official, minimal base images; for S2I prefer the Red Hat UBI builder images
+  (registry.redhat.io/ubi9/...).
+- Install dependencies before copying application code so image layers cache well.
+- Run as a non-root user and expose only the port the application listens on
+  (8080 unless the code says otherwise).
+- When a tool is requested, answer only by calling it with input matching its schema.
+- When asked for a file, return only the file content without explanations or markdown fences."""
+
+# Tools offered on structured calls. All of them send the same list and pick
+# one with toolChoice, so their cached prefix is the same. Free-text calls
+# send no tools at all.
+STRUCTURED_TOOLS = {
+    "repo_analysis": (RepoAnalysis, "Record the structured analysis of the repository"),
+    "s2i_config": (S2IConfig, "Record the recommended S2I build configuration")
+}
+
+class StructuredOutputError(Exception):
+    """Bedrock did not return data matching the requested schema, even after a repair attempt"""
+
+_agent = None
+_agent_lock = threading.Lock()
+_docker_check_cache = {"result": None, "checked_at": 0.0}
 
 class BedrockDockerAgent:
     def __init__(self, region_name: str = "us-east-1"):
         """Initialize AWS Bedrock client using environment variables"""
+        import boto3
         self.bedrock = boto3.client(
             'bedrock-runtime',
             region_name=region_name,
@@ -17,19 +69,18 @@ class BedrockDockerAgent:
             aws_session_token=os.getenv('AWS_SESSION_TOKEN')
         )
         self.model_id = "amazon.nova-lite-v1:0"
+        # Without a botocore that models cachePoint, calls go out uncached
+        self.cache_points = supports_cache_points(self.bedrock)
     
     def analyze_project_and_create_dockerfile(self, project_path: str) -> str:
         """Use Bedrock to analyze project and generate Dockerfile"""
         
-        # Analyze project structure
-        project_info = self._analyze_project_structure(project_path)
+        # Continue the workspace conversation; the structure is only read and
+        # sent when no conversation exists yet
+        session = self.workspace_session(project_path)
         
-        # Create prompt for Bedrock
-        prompt = f"""
-        Analyze this project structure and create an optimized Dockerfile:
-        
-        Project Path: {project_path}
-        Files and Structure: {project_info}
+        prompt = """
+        Create an optimized Dockerfile for this project.
         
         Generate a production-ready Dockerfile that:
         1. Uses appropriate base image
@@ -43,7 +94,7 @@ class BedrockDockerAgent:
         
         # Call Bedrock
         try:
-            response = self._call_bedrock(prompt)
+            response = self._call_bedrock(prompt, session=session)
             dockerfile_content = response.strip()
             
             # Save Dockerfile to project directory
@@ -55,17 +106,54 @@ class BedrockDockerAgent:
         
         return dockerfile_path
     
-    def _analyze_project_structure(self, project_path: str) -> str:
-        """Analyze project structure and return summary"""
-        structure = []
+    def analyze_repository(self, repo_name: str, session: BedrockSession) -> Tuple[RepoAnalysis, Dict[str, Any]]:
+        """Structured analysis of the repository a workspace conversation describes"""
+        prompt = f"""
+        Analyze this repository and provide a detailed summary:
         
-        for root, dirs, files in os.walk(project_path):
-            # Skip hidden directories and common build directories
-            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'venv']]
-            
-            level = root.replace(project_path, '').count(os.sep)
+        Repository: {repo_name}
+        
+        Record the project type, important files, dependencies, the port the
+        application listens on, build instructions and runtime requirements.
+        """
+        return self._call_bedrock_structured(
+            prompt, RepoAnalysis, "repo_analysis", STRUCTURED_TOOLS["repo_analysis"][1], session
+        )
+    
+    def workspace_session(self, project_path: str, project_info: str = None,
+                          manifests: Dict[str, str] = None, key: str = None) -> BedrockSession:
+        """Conversation about one repository workspace.
+
+        Without project_info an existing conversation is reused as is;
+        otherwise the conversation is replaced if the given structure differs
+        from the one it was started with. key defaults to the absolute path.
+        """
+        key = key or os.path.abspath(project_path)
+        manager = get_session_manager()
+        if project_info is None:
+            session = manager.get(key)
+            if session is not None:
+                return session
+            project_info = self._analyze_project_structure(project_path)
+        return manager.get_or_create(key, _repository_context(project_info, manifests))
+    
+    def _analyze_project_structure(self, project_path: str, tree_paths: List[str] = None) -> str:
+        """Analyze project structure and return summary.
+
+        With tree_paths (repository-relative paths, e.g. from ``git ls-tree``)
+        the summary is built from the listing instead of walking project_path.
+        """
+        if tree_paths is not None:
+            entries = _tree_listing_entries(tree_paths)
+        else:
+            entries = _walk_entries(project_path)
+        
+        structure = []
+        root_name = os.path.basename(os.path.normpath(project_path))
+        for rel_dir, files in entries:
+            level = rel_dir.count('/') + 1 if rel_dir else 0
             indent = ' ' * 2 * level
-            structure.append(f"{indent}{os.path.basename(root)}/")
+            structure.append(f"{indent}{os.path.basename(rel_dir) if rel_dir else root_name}/")
             
             subindent = ' ' * 2 * (level + 1)
             for file in files[:10]:  # Limit to first 10 files per directory
@@ -73,30 +161,135 @@ class BedrockDockerAgent:
         
         return '\n'.join(structure[:50])  # Limit output
     
-    def _call_bedrock(self, prompt: str) -> str:
-        """Call AWS Bedrock with the given prompt"""
-        try:
-            body = {
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [{"text": prompt}]
-                    }
-                ],
-                "inferenceConfig": {
-                    "max_new_tokens": 2000
+    def _tool_config(self, tool_name: str, schema: Type[BaseModel] = None,
+                     description: str = None) -> Dict[str, Any]:
+        """The shared tool list, forcing tool_name"""
+        tools = dict(STRUCTURED_TOOLS)
+        if tool_name not in tools:
+            tools[tool_name] = (schema, description)
+        return {
+            "tools": [{
+                "toolSpec": {
+                    "name": name,
+                    "description": tool_description,
+                    "inputSchema": {"json": tool_schema.model_json_schema()}
                 }
-            }
-            
-            response = self.bedrock.invoke_model(
+            } for name, (tool_schema, tool_description) in tools.items()],
+            "toolChoice": {"tool": {"name": tool_name}}
+        }
+    
+    def _converse(self, messages: List[Dict[str, Any]], tool_config: Dict[str, Any] = None,
+                  temperature: float = None) -> Dict[str, Any]:
+        """One Converse call with the cached system prompt; token usage is recorded.
+
+        Without tool_config no tools are offered. Conversation history holds
+        only text, so text and structured calls can share a session.
+        """
+        inference_config = {"maxTokens": 2000}
+        if temperature is not None:
+            inference_config["temperature"] = temperature
+        system = [{"text": SYSTEM_PROMPT}, CACHE_POINT]
+        if not self.cache_points:
+            system = without_cache_points(system)
+            messages = [dict(message, content=without_cache_points(message["content"])) for message in messages]
+        request = {"toolConfig": tool_config} if tool_config else {}
+        try:
+            response = self.bedrock.converse(
                 modelId=self.model_id,
-                body=json.dumps(body)
+                system=system,
+                messages=messages,
+                inferenceConfig=inference_config,
+                **request
             )
-            
-            response_body = json.loads(response['body'].read())
-            return response_body['output']['message']['content'][0]['text']
         except Exception as e:
             raise Exception(f"Bedrock API call failed: {str(e)}")
+        record_usage(response.get("usage", {}))
+        return response
+    
+    def _call_bedrock(self, prompt: str, session: BedrockSession = None) -> str:
+        """Call AWS Bedrock with the given prompt, continuing session if given"""
+        if session is None:
+            return self._call_bedrock_text([{"role": "user", "content": [{"text": prompt}]}])
+        with session.lock:
+            messages = session.messages_for(prompt)
+            text = self._call_bedrock_text(messages)
+            session.record_turn(messages[-1], text)
+        return text
+    
+    def _call_bedrock_text(self, messages: List[Dict[str, Any]]) -> str:
+        # No tools on free-text calls, so the reply is always text
+        response = self._converse(messages)
+        content = response["output"]["message"]["content"]
+        text = "".join(block.get("text", "") for block in content)
+        if not text:
+            raise Exception("Bedrock API call failed: reply contained no text")
+        return text
+    
+    def _call_bedrock_structured(self, prompt: str, schema: Type[ModelT], tool_name: str,
+                                 description: str, session: BedrockSession = None) -> Tuple[ModelT, Dict[str, Any]]:
+        """Call Bedrock through the Converse API with a forced tool whose input is the schema.
+
+        If the reply is not valid for the schema (e.g. the model answered in
+        text, possibly inside markdown fences), the JSON is extracted leniently
+        and, failing that, the model gets one repair turn with the validation
+        error. With a session the call continues that conversation and the
+        result is kept in it. Returns the parsed model and call metadata.
+        """
+        if session is None:
+            return self._structured_attempts(
+                [{"role": "user", "content": [{"text": prompt}]}], schema, tool_name, description
+            )
+        with session.lock:
+            messages = session.messages_for(prompt)
+            user_message = messages[-1]
+            result, meta = self._structured_attempts(messages, schema, tool_name, description)
+            # Kept as plain text so later turns need no matching toolResult
+            session.record_turn(user_message, result.model_dump_json())
+        return result, meta
+    
+    def _structured_attempts(self, messages: List[Dict[str, Any]], schema: Type[ModelT], tool_name: str,
+                             description: str) -> Tuple[ModelT, Dict[str, Any]]:
+        tool_config = self._tool_config(tool_name, schema, description)
+        messages = list(messages)
+        meta = {"attempts": 0, "repaired": False}
+        
+        for attempt in range(2):
+            meta["attempts"] = attempt + 1
+            response = self._converse(messages, tool_config, temperature=0)
+            
+            content = response["output"]["message"]["content"]
+            tool_use = next((block["toolUse"] for block in content if "toolUse" in block), None)
+            raw = tool_use["input"] if tool_use else extract_json(
+                "".join(block.get("text", "") for block in content)
+            )
+            try:
+                if raw is None:
+                    raise ValueError("Reply did not contain a JSON object")
+                meta["repaired"] = attempt > 0
+                return schema.model_validate(raw), meta
+            except ValidationError as e:
+                error = "; ".join(
+                    f"{'.'.join(str(part) for part in err['loc']) or 'input'}: {err['msg']}" for err in e.errors()
+                )
+            except ValueError as e:
+                error = str(e)
+            
+            # Targeted repair: show the model its reply and what was wrong with it
+            messages.append(response["output"]["message"])
+            if tool_use:
+                messages.append({"role": "user", "content": [{
+                    "toolResult": {
+                        "toolUseId": tool_use["toolUseId"],
+                        "content": [{"text": f"Invalid input: {error}"}],
+                        "status": "error"
+                    }
+                }, {"text": f"Call {tool_name} again with input that fixes these errors."}]})
+            else:
+                messages.append({"role": "user", "content": [{
+                    "text": f"That reply could not be used: {error}. Call {tool_name} with the corrected data."
+                }]})
+        
+        raise StructuredOutputError(f"No valid {schema.__name__} after repair: {error}")
     
     def test_prompt(self) -> Dict[str, Any]:
         """Test method that sends hello bedrock prompt and returns JSON response"""
@@ -113,19 +306,21 @@ class BedrockDockerAgent:
                 "error": str(e)
             }
     
-    def analyze_and_containerize_with_s2i(self, project_path: str = "cloned_repos") -> Dict[str, Any]:
+    async def analyze_and_containerize_with_s2i(self, project_path: str = "cloned_repos") -> Dict[str, Any]:
         """Use Bedrock AI to analyze project and generate S2I containerized image"""
+        from s2i_builder import containerize_with_s2i
+        from s2i_setup import check_s2i_installation
         
         if not os.path.exists(project_path):
             return {"error": f"Directory '{project_path}' not found"}
         
-        project_info = self._analyze_project_structure(project_path)
+        with span("project_structure"):
+            session = await asyncio.to_thread(self.workspace_session, project_path)
         
         prompt = f"""
         Analyze this project and recommend S2I configuration:
         
         Project: {project_path}
-        Structure: {project_info}
         
         Return JSON with:
         {{
@@ -136,18 +331,20 @@ class BedrockDockerAgent:
         """
         
         try:
-            ai_response = self._call_bedrock(prompt)
-            
             try:
-                ai_config = json.loads(ai_response.strip())
-            except:
-                ai_config = {
-                    "builder_image": "registry.redhat.io/ubi9/python-311",
-                    "output_image": "ai-generated-app",
-                    "environment_vars": {}
-                }
+                with span("bedrock"):
+                    config, llm_meta = await asyncio.to_thread(
+                        self._call_bedrock_structured, prompt, S2IConfig,
+                        "s2i_config", STRUCTURED_TOOLS["s2i_config"][1], session
+                    )
+                llm_meta["source"] = "bedrock"
+            except StructuredOutputError as e:
+                # Only reached when the repair turn failed too
+                config = S2IConfig()
+                llm_meta = {"source": "default", "error": str(e)}
+            ai_config = config.model_dump()
             
-            s2i_check = check_s2i_installation()
+            s2i_check = await check_s2i_installation()
             if not s2i_check.get("installed"):
                 return {
                     "error": "S2I not installed",
@@ -155,7 +352,7 @@ class BedrockDockerAgent:
                 }
             
             # Check Docker daemon before S2I build
-            daemon_check = check_docker_daemon()
+            daemon_check = await check_docker_daemon()
             if not daemon_check.get("running"):
                 return {
                     "error": "Docker daemon not running",
@@ -164,7 +361,7 @@ class BedrockDockerAgent:
                     "ai_recommendation": ai_config
                 }
             
-            s2i_result = containerize_with_s2i(
+            s2i_result = await containerize_with_s2i(
                 project_path,
                 ai_config["builder_image"],
                 ai_config["output_image"]
@@ -173,39 +370,93 @@ class BedrockDockerAgent:
             return {
                 "success": s2i_result.get("success", False),
                 "ai_recommendation": ai_config,
+                "ai_output": llm_meta,
                 "s2i_result": s2i_result
             }
             
         except Exception as e:
             return {"error": f"Bedrock S2I analysis failed: {str(e)}"}
     
-def check_docker_daemon() -> Dict[str, Any]:
+def _repository_context(project_info: str, manifests: Dict[str, str] = None) -> str:
+    """Repository description opening a workspace conversation"""
+    manifest_text = "\n".join(
+        f"--- {path} ---\n{content}" for path, content in (manifests or {}).items()
+    )
+    return f"Project Structure:\n{project_info}\n\nManifest Files:\n{manifest_text or '(not fetched)'}"
+
+def _walk_entries(project_path: str) -> List[Tuple[str, List[str]]]:
+    """(relative dir, files) pairs for a checked-out tree, in os.walk order"""
+    entries = []
+    for root, dirs, files in os.walk(project_path):
+        dirs[:] = [d for d in dirs if not skip_dir(d)]
+        rel_dir = os.path.relpath(root, project_path)
+        entries.append(('' if rel_dir == '.' else rel_dir.replace(os.sep, '/'), files))
+    return entries
+
+def _tree_listing_entries(tree_paths: List[str]) -> List[Tuple[str, List[str]]]:
+    """(relative dir, files) pairs built from a repository path listing"""
+    files_by_dir = {'': []}
+    subdirs = {'': set()}
+    for path in tree_paths:
+        parts = path.split('/')
+        if any(skip_dir(part) for part in parts[:-1]):
+            continue
+        for depth in range(1, len(parts)):
+            rel_dir = '/'.join(parts[:depth])
+            if rel_dir not in files_by_dir:
+                files_by_dir[rel_dir] = []
+                subdirs[rel_dir] = set()
+                subdirs['/'.join(parts[:depth - 1])].add(rel_dir)
+        files_by_dir['/'.join(parts[:-1])].append(parts[-1])
+    
+    entries = []
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        entries.append((rel_dir, files_by_dir[rel_dir]))
+        pending.extend(sorted(subdirs[rel_dir], reverse=True))
+    return entries
+
+def get_bedrock_agent() -> BedrockDockerAgent:
+    """Return the shared Bedrock agent, creating the boto3 client on first use"""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = BedrockDockerAgent()
+    return _agent
+
+async def check_docker_daemon(refresh: bool = False) -> Dict[str, Any]:
     """Check if Docker daemon is running"""
+    # A positive answer is reused for DOCKER_CHECK_TTL seconds; failures are always re-probed
+    cached = _docker_check_cache["result"]
+    if not refresh and cached and time.monotonic() - _docker_check_cache["checked_at"] < DOCKER_CHECK_TTL:
+        return cached
     try:
-        result = subprocess.run(["docker", "info"], capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            return {"running": True, "message": "Docker daemon is running"}
+        result = await run_command([DOCKER_BIN, "info"], timeout=10, group="docker")
+        if result.ok:
+            _docker_check_cache["result"] = {"running": True, "message": "Docker daemon is running"}
+            _docker_check_cache["checked_at"] = time.monotonic()
+            return _docker_check_cache["result"]
+        elif result.timed_out:
+            return {"running": False, "error": "Docker daemon timeout"}
         else:
             return {"running": False, "error": result.stderr}
-    except subprocess.TimeoutExpired:
-        return {"running": False, "error": "Docker daemon timeout"}
     except FileNotFoundError:
         return {"running": False, "error": "Docker not installed"}
     except Exception as e:
         return {"running": False, "error": str(e)}
 
-def start_docker_daemon() -> Dict[str, Any]:
+async def start_docker_daemon() -> Dict[str, Any]:
     """Attempt to start Docker daemon on Windows"""
     try:
         # Try starting Docker Desktop
-        subprocess.run(["powershell", "-Command", "Start-Process 'Docker Desktop'"], 
-                      capture_output=True, timeout=30)
+        await run_command(["powershell", "-Command", "Start-Process 'Docker Desktop'"], timeout=30)
         
         # Wait and check if daemon started
-        import time
-        time.sleep(10)
+        await asyncio.sleep(10)
         
-        daemon_check = check_docker_daemon()
+        daemon_check = await check_docker_daemon(refresh=True)
         if daemon_check.get("running"):
             return {"success": True, "message": "Docker daemon started successfully"}
         else:
@@ -213,20 +464,104 @@ def start_docker_daemon() -> Dict[str, Any]:
     except Exception as e:
         return {"error": f"Failed to start Docker: {str(e)}"}
 
-def build_and_run_docker(directory_path: str, image_name: str = None, container_name: str = None) -> Dict[str, Any]:
-    """Build and run Docker image with daemon check"""
+async def _build_and_run_on_host(host, directory_path: str, image_name: str, container_name: str,
+                                 run_container: bool = True) -> Dict[str, Any]:
+    """Build and start the image on one docker host chosen by the build scheduler"""
+    reclaimer = get_reclaimer()
+    
+    # Build Docker image through BuildKit with the project's layer cache. The
+    # cache directory is reclaimable like a workspace, but not while in use.
+    async with cache_lock(image_name):
+        with reclaimer.in_use(workspaces=[cache_dir_for(image_name)]):
+            build_cmd, build_cache = await build_command(host, directory_path, image_name, [MANAGED_LABEL])
+            store = get_log_store()
+            build_log_id = store.start_command_log("docker-build", build_cmd)
+            # Output goes to the log store; cache hits are counted as it streams
+            cache_stats = CacheStatsCounter()
+            write_log = store.writer(build_log_id)
+            
+            def on_output(text: str):
+                write_log(text)
+                cache_stats.feed(text)
+            
+            try:
+                with span("docker_build"):
+                    build_result = await run_command(
+                        build_cmd, timeout=BUILD_TIMEOUT, group=f"build:{host.name}", env=host.env, on_output=on_output
+                    )
+            finally:
+                await asyncio.to_thread(store.finalize, build_log_id)
+            if build_result.ok:
+                await asyncio.to_thread(commit_cache, build_cache)
+    build_cache.update(cache_stats.stats())
+    
+    if not build_result.ok:
+        return {
+            "error": f"Docker build failed: {tail_text(build_result.stderr)}",
+            "build_log_id": build_log_id,
+            "build_output_tail": tail_text(build_result.stdout),
+            "build_duration": round(build_result.duration, 3),
+            "build_cache": build_cache,
+            "timed_out": build_result.timed_out,
+            "host_failure": is_host_failure(build_result)
+        }
+    
+    await reclaimer.track_image(image_name, host.docker_host)
+    if not run_container:
+        return {
+            "success": True,
+            "image_name": image_name,
+            "build_log_id": build_log_id,
+            "build_output_tail": tail_text(build_result.stdout),
+            "build_duration": round(build_result.duration, 3),
+            "build_cache": build_cache
+        }
+    
+    # Run Docker container
+    run_cmd = host.docker("run", "-d", "--label", MANAGED_LABEL, *container_run_args(),
+                          "--name", container_name, "-p", "8080:8080", image_name)
+    with span("docker_run"):
+        run_result = await run_command(run_cmd, timeout=DOCKER_CLI_TIMEOUT, group="docker", env=host.env)
+    
+    if not run_result.ok:
+        return {
+            "error": f"Docker run failed: {run_result.stderr}",
+            "run_output": run_result.stdout,
+            "host_failure": is_host_failure(run_result)
+        }
+    
+    reclaimer.track_container(run_result.stdout.strip(), image_name, host.docker_host)
+    return {
+        "success": True,
+        "image_name": image_name,
+        "container_name": container_name,
+        "container_id": run_result.stdout.strip(),
+        "build_log_id": build_log_id,
+        "build_output_tail": tail_text(build_result.stdout),
+        "build_duration": round(build_result.duration, 3),
+        "build_cache": build_cache
+    }
+
+async def build_and_run_docker(directory_path: str, image_name: str = None, container_name: str = None,
+                               run_container: bool = True) -> Dict[str, Any]:
+    """Build and run Docker image with daemon check; run_container=False only builds"""
+    scheduler = get_build_scheduler()
+    
     # Check Docker daemon first
-    daemon_check = check_docker_daemon()
-    if not daemon_check.get("running"):
-        # Try to start daemon
-        start_result = start_docker_daemon()
-        if "error" in start_result:
-            return {
-                "error": "Docker daemon not running",
-                "daemon_error": daemon_check.get("error"),
-                "start_attempt": start_result,
-                "suggestion": "Start Docker Desktop manually"
-            }
+    if scheduler.local_only:
+        daemon_check = await check_docker_daemon()
+        if not daemon_check.get("running"):
+            # Try to start daemon
+            start_result = await start_docker_daemon()
+            if "error" in start_result:
+                return {
+                    "error": "Docker daemon not running",
+                    "daemon_error": daemon_check.get("error"),
+                    "start_attempt": start_result,
+                    "suggestion": "Start Docker Desktop manually"
+                }
+    elif not await scheduler.any_healthy():
+        return {"error": "No healthy docker endpoint available", "docker_hosts": scheduler.status()}
     
     try:
         # Validate directory and Dockerfile
@@ -243,41 +578,26 @@ def build_and_run_docker(directory_path: str, image_name: str = None, container_
         if not container_name:
             container_name = f"container-{os.path.basename(directory_path)}".lower()
         
-        # Build Docker image
-        build_cmd = ["docker", "build", "-t", image_name, directory_path]
-        build_result = subprocess.run(build_cmd, capture_output=True, text=True)
-        
-        if build_result.returncode != 0:
-            return {
-                "error": f"Docker build failed: {build_result.stderr}",
-                "build_output": build_result.stdout
-            }
-        
-        # Run Docker container
-        run_cmd = ["docker", "run", "-d", "--name", container_name, "-p", "8080:8080", image_name]
-        run_result = subprocess.run(run_cmd, capture_output=True, text=True)
-        
-        if run_result.returncode != 0:
-            return {
-                "error": f"Docker run failed: {run_result.stderr}",
-                "run_output": run_result.stdout
-            }
-        
-        return {
-            "success": True,
-            "image_name": image_name,
-            "container_name": container_name,
-            "container_id": run_result.stdout.strip(),
-            "build_output": build_result.stdout
-        }
+        # Protect the build context and image from reclamation while in use
+        with get_reclaimer().in_use(workspaces=[directory_path], images=[image_name]):
+            # Keep VCS data, dependency trees and caches out of the context sent to the daemon
+            with span("prune_context"):
+                build_context = await asyncio.to_thread(prune_build_context, directory_path)
+            # Place the build on the least loaded host, preferring one that has the base image
+            result = await scheduler.run(
+                lambda host: _build_and_run_on_host(host, directory_path, image_name, container_name, run_container),
+                image=dockerfile_base_image(dockerfile_path),
+                produced_images=[image_name]
+            )
+            result["build_context"] = build_context
+            return result
         
     except Exception as e:
         return {"error": f"Failed to build/run Docker: {str(e)}"}
 
-def build_and_run_existing_dockerfile(directory_path: str, image_name: str = None, container_name: str = None) -> Dict[str, Any]:
+async def build_and_run_existing_dockerfile(directory_path: str, image_name: str = None, container_name: str = None) -> Dict[str, Any]:
     """Build and run Docker image from existing Dockerfile in directory"""
-    agent = BedrockDockerAgent()
-    return agent.build_and_run_docker(directory_path, image_name, container_name)
+    return await build_and_run_docker(directory_path, image_name, container_name)
 
 def create_docker_image_for_project(cloned_repos_dir: str = "cloned_repos") -> Dict[str, Any]:
     """Main function to create Docker image for a project using Bedrock"""
@@ -289,9 +609,10 @@ def create_docker_image_for_project(cloned_repos_dir: str = "cloned_repos") -> D
     if not os.path.exists(project_path):
         return {"error": f"Project '{safe_dir}' not found"}
     
+    usage = begin_usage()
     try:
         # Initialize Bedrock agent
-        agent = BedrockDockerAgent()
+        agent = get_bedrock_agent()
         
         # Generate Dockerfile using Bedrock
         dockerfile_path = agent.analyze_project_and_create_dockerfile(project_path)
@@ -300,17 +621,20 @@ def create_docker_image_for_project(cloned_repos_dir: str = "cloned_repos") -> D
             "success": True,
             "message": f"Dockerfile created successfully for {cloned_repos_dir}",
             "dockerfile_path": dockerfile_path,
-            "project_path": project_path
+            "project_path": project_path,
+            "bedrock_usage": usage
         }
         #https://github.com/mmumshad/simple-webapp-flask.git
     except Exception as e:
         return {"error": f"Failed to create Dockerfile: {str(e)}"}
 
-def containerize_project_with_s2i(source_path: str = "cloned_repos", builder_image: str = None, output_image: str = "my-flask-app") -> Dict[str, Any]:
+async def containerize_project_with_s2i(source_path: str = "cloned_repos", builder_image: str = None, output_image: str = "my-flask-app") -> Dict[str, Any]:
     """Containerize project using S2I instead of Dockerfile"""
+    from s2i_builder import containerize_with_s2i
+    from s2i_setup import check_s2i_installation
     
     # Check S2I installation
-    s2i_check = check_s2i_installation()
+    s2i_check = await check_s2i_installation()
     if not s2i_check.get("installed"):
         return {
             "error": "S2I not installed",
@@ -319,13 +643,14 @@ def containerize_project_with_s2i(source_path: str = "cloned_repos", builder_ima
         }
     
     # Use S2I to containerize
-    return containerize_with_s2i(source_path, builder_image, output_image)
+    return await containerize_with_s2i(source_path, builder_image, output_image)
 
-def setup_s2i_environment() -> Dict[str, Any]:
+async def setup_s2i_environment() -> Dict[str, Any]:
     """Setup S2I environment and check prerequisites"""
+    from s2i_setup import install_s2i, check_s2i_installation
     
     # Check current installation
-    s2i_status = check_s2i_installation()
+    s2i_status = await check_s2i_installation()
     
     if s2i_status.get("installed"):
         return {
@@ -335,14 +660,14 @@ def setup_s2i_environment() -> Dict[str, Any]:
         }
     else:
         # Attempt installation
-        install_result = install_s2i()
+        install_result = await install_s2i()
         return {
             "status": "setup_required",
             "install_result": install_result
         }
 
-def bedrock_s2i_containerize(project_path: str = "cloned_repos") -> Dict[str, Any]:
+async def bedrock_s2i_containerize(project_path: str = "cloned_repos") -> Dict[str, Any]:
     """Use Bedrock AI to analyze directory and generate S2I containerized image"""
-    agent = BedrockDockerAgent()
-    return agent.analyze_and_containerize_with_s2i(project_path)
+    agent = await asyncio.to_thread(get_bedrock_agent)
+    return await agent.analyze_and_containerize_with_s2i(project_path)
 
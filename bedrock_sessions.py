@@ -0,0 +1,144 @@
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+# Converse API content block marking the end of a cacheable prompt prefix
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+def supports_cache_points(client) -> bool:
+    """Whether a bedrock-runtime client's service model knows cachePoint blocks.
+
+    botocore validates requests against its bundled model, so older
+    releases reject cache points before the request is sent.
+    """
+    try:
+        return "cachePoint" in client.meta.service_model.shape_for("SystemContentBlock").members
+    except Exception:
+        return False
+
+def without_cache_points(blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Content blocks with cache points removed, for clients that cannot send them"""
+    return [block for block in blocks if "cachePoint" not in block]
+
+SESSION_TTL = int(os.getenv("BEDROCK_SESSION_TTL", "1800"))
+SESSION_MAX_TURNS = int(os.getenv("BEDROCK_SESSION_MAX_TURNS", "10"))
+
+_usage: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("bedrock_usage", default=None)
+
+def begin_usage() -> Dict[str, Any]:
+    """Start accumulating Bedrock token usage for the current request"""
+    usage = {
+        "calls": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_read_input_tokens": 0,
+        "cache_write_input_tokens": 0
+    }
+    _usage.set(usage)
+    return usage
+
+def record_usage(response_usage: Dict[str, Any]):
+    """Add the usage block of a Converse response to the current request's totals"""
+    usage = _usage.get()
+    if usage is None or not response_usage:
+        return
+    usage["calls"] += 1
+    usage["input_tokens"] += response_usage.get("inputTokens", 0)
+    usage["output_tokens"] += response_usage.get("outputTokens", 0)
+    usage["cache_read_input_tokens"] += response_usage.get("cacheReadInputTokens", 0)
+    usage["cache_write_input_tokens"] += response_usage.get("cacheWriteInputTokens", 0)
+    prompt_tokens = usage["input_tokens"] + usage["cache_read_input_tokens"] + usage["cache_write_input_tokens"]
+    usage["cached_fraction"] = round(usage["cache_read_input_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0
+
+class BedrockSession:
+    """A conversation about one repository workspace.
+
+    The first user turn carries the repository context followed by a cache
+    point, so follow-up questions resend an identical, cacheable prefix
+    instead of a fresh copy of the tree.
+    """
+
+    def __init__(self, key: str, context: str):
+        self.key = key
+        self.context = context
+        self.context_hash = hashlib.sha256(context.encode()).hexdigest()
+        self.history: List[Dict[str, Any]] = []
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.turns = 0
+        self.lock = threading.Lock()
+
+    def messages_for(self, prompt: str) -> List[Dict[str, Any]]:
+        """History plus a new user turn for prompt"""
+        if not self.history:
+            content = [{"text": f"Repository context:\n{self.context}"}, CACHE_POINT, {"text": prompt}]
+        else:
+            content = [{"text": prompt}]
+        return self.history + [{"role": "user", "content": content}]
+
+    def record_turn(self, user_message: Dict[str, Any], reply_text: str):
+        """Keep a completed exchange; the oldest follow-ups are dropped past SESSION_MAX_TURNS"""
+        self.history += [user_message, {"role": "assistant", "content": [{"text": reply_text}]}]
+        # Always keep the first exchange, it holds the cached repository context
+        if len(self.history) > 2 * SESSION_MAX_TURNS:
+            self.history = self.history[:2] + self.history[-(2 * SESSION_MAX_TURNS - 2):]
+        self.turns += 1
+        self.last_used = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "turns": self.turns,
+            "created_at": self.created_at,
+            "last_used": self.last_used
+        }
+
+class SessionManager:
+    """Keeps one BedrockSession per repository workspace"""
+
+    def __init__(self):
+        self._sessions: Dict[str, BedrockSession] = {}
+        self._lock = threading.Lock()
+
+    def _evict_expired(self):
+        now = time.time()
+        for key in [key for key, session in self._sessions.items() if now - session.last_used > SESSION_TTL]:
+            del self._sessions[key]
+
+    def get(self, key: str) -> Optional[BedrockSession]:
+        """Existing live session for key, if any"""
+        with self._lock:
+            self._evict_expired()
+            return self._sessions.get(key)
+
+    def get_or_create(self, key: str, context: str) -> BedrockSession:
+        """Reuse the session for key unless its repository context changed"""
+        context_hash = hashlib.sha256(context.encode()).hexdigest()
+        with self._lock:
+            self._evict_expired()
+            session = self._sessions.get(key)
+            if session is None or session.context_hash != context_hash:
+                session = BedrockSession(key, context)
+                self._sessions[key] = session
+            return session
+
+    def drop(self, key: str):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._evict_expired()
+            return [session.to_dict() for session in self._sessions.values()]
+
+_manager = None
+
+def get_session_manager() -> SessionManager:
+    """Return the process-wide session manager"""
+    global _manager
+    if _manager is None:
+        _manager = SessionManager()
+    return _manager
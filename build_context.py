@@ -0,0 +1,244 @@
+import os
+import re
+from typing import Dict, Any, List, Optional, Set
+
+# BUILD_CONTEXT_PRUNE=0 leaves .dockerignore/.s2iignore untouched
+BUILD_CONTEXT_PRUNE = os.getenv("BUILD_CONTEXT_PRUNE", "1") != "0"
+
+BLOCK_START = "# >>> generated build-context ignores"
+BLOCK_END = "# <<< generated build-context ignores"
+_TYPES_PREFIX = "# project types:"
+
+# .dockerignore syntax; "**/" matches at any depth. Only VCS data, dependency
+# trees and caches: build outputs such as target/, build/, dist/ or bin/ are
+# kept, since Dockerfiles often COPY prebuilt artifacts from them.
+COMMON_IGNORES = [
+    ".git", ".hg", ".svn", ".idea", ".vscode",
+    "**/.DS_Store", "**/*.swp", "**/*.log",
+    "**/testdata", "**/test-data"
+]
+PROJECT_IGNORES = {
+    "python": [
+        "**/__pycache__", "**/*.py[cod]", ".venv", "venv", ".tox", ".nox",
+        ".pytest_cache", ".mypy_cache", ".ruff_cache", "htmlcov", ".coverage",
+        "*.egg-info"
+    ],
+    "nodejs": [
+        "**/node_modules", "**/npm-debug.log*", "**/yarn-error.log*",
+        "coverage", ".next/cache", ".parcel-cache", ".turbo"
+    ],
+    "java": [".gradle"],
+    "go": []
+}
+# Files that identify a project type when no analysis is available
+_MANIFEST_TYPES = {
+    "requirements.txt": "python",
+    "pyproject.toml": "python",
+    "setup.py": "python",
+    "Pipfile": "python",
+    "package.json": "nodejs",
+    "pom.xml": "java",
+    "build.gradle": "java",
+    "build.gradle.kts": "java",
+    "go.mod": "go"
+}
+# Keywords of free-form project types (e.g. "python-flask") per ignore set
+_TYPE_KEYWORDS = {
+    "python": ("python", "flask", "django", "fastapi"),
+    "nodejs": ("node", "javascript", "typescript", "react", "express", "next", "vue", "angular"),
+    "java": ("java", "spring", "maven", "gradle", "kotlin"),
+    "go": ("golang", "go")
+}
+# s2i expands .s2iignore lines with a plain glob, so "**/" patterns are
+# unrolled to this many directory levels
+S2I_GLOB_DEPTH = 3
+
+def normalize_project_type(project_type: str) -> Optional[str]:
+    """Map a free-form project type to a key of PROJECT_IGNORES"""
+    words = set(re.split(r"[^a-z0-9]+", (project_type or "").lower()))
+    for key, keywords in _TYPE_KEYWORDS.items():
+        if words.intersection(keywords):
+            return key
+    return None
+
+def detect_project_types(context_dir: str) -> Set[str]:
+    """Project types implied by manifest files at the top of context_dir"""
+    try:
+        names = set(os.listdir(context_dir))
+    except OSError:
+        return set()
+    return {project_type for name, project_type in _MANIFEST_TYPES.items() if name in names}
+
+def _pattern_regex(pattern: str) -> re.Pattern:
+    """Regex for a .dockerignore pattern; a match on a directory covers its contents"""
+    pattern = pattern.strip("/")
+    regex = ""
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            regex += "(?:.*/)?"
+            index += 3
+        elif pattern.startswith("**", index):
+            regex += ".*"
+            index += 2
+        elif pattern[index] == "*":
+            regex += "[^/]*"
+            index += 1
+        elif pattern[index] == "?":
+            regex += "[^/]"
+            index += 1
+        elif pattern[index] == "[":
+            close = pattern.find("]", index)
+            if close == -1:
+                regex += re.escape(pattern[index])
+                index += 1
+            else:
+                regex += pattern[index:close + 1]
+                index = close + 1
+        else:
+            regex += re.escape(pattern[index])
+            index += 1
+    return re.compile(f"^{regex}(?:/.*)?$")
+
+def parse_ignore_file(path: str) -> List[str]:
+    """Patterns of an ignore file, without comments and blank lines"""
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+class IgnoreMatcher:
+    """Evaluates ignore patterns in order; a later "!pattern" re-includes paths"""
+
+    def __init__(self, patterns: List[str]):
+        self.rules = []
+        for pattern in patterns:
+            negated = pattern.startswith("!")
+            self.rules.append((negated, _pattern_regex(pattern[1:] if negated else pattern)))
+        self.has_negations = any(negated for negated, _ in self.rules)
+
+    def ignored(self, rel_path: str) -> bool:
+        result = False
+        for negated, regex in self.rules:
+            if regex.match(rel_path):
+                result = not negated
+        return result
+
+def _s2i_patterns(patterns: List[str]) -> List[str]:
+    """Translate .dockerignore patterns to plain globs for .s2iignore"""
+    result = []
+    for pattern in patterns:
+        if pattern.startswith("**/"):
+            name = pattern[3:]
+            result.extend("*/" * depth + name for depth in range(S2I_GLOB_DEPTH))
+        elif "**" not in pattern:
+            result.append(pattern)
+    return result
+
+def _merge_ignore_file(path: str, patterns: List[str], project_types: List[str]) -> str:
+    """Write patterns into the generated block of an ignore file.
+
+    The block is kept at the top so lines the project wrote itself, including
+    "!" re-includes, still take precedence. Patterns already listed outside
+    the block are not repeated. Returns "created", "merged" or "unchanged".
+    """
+    existed = os.path.exists(path)
+    lines = []
+    if existed:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    if BLOCK_START in lines and BLOCK_END in lines[lines.index(BLOCK_START):]:
+        start = lines.index(BLOCK_START)
+        end = lines.index(BLOCK_END, start)
+        own_lines = lines[:start] + lines[end + 1:]
+    else:
+        own_lines = lines
+
+    own_patterns = {line.strip() for line in own_lines}
+    block = [BLOCK_START, f"{_TYPES_PREFIX} {', '.join(project_types) or 'unknown'}"]
+    block += [pattern for pattern in patterns if pattern not in own_patterns]
+    block.append(BLOCK_END)
+    content = "\n".join(block + own_lines) + "\n"
+
+    if existed and "\n".join(lines) + "\n" == content:
+        return "unchanged"
+    with open(path, "w") as f:
+        f.write(content)
+    return "merged" if existed else "created"
+
+def _recorded_types(path: str) -> Set[str]:
+    """Project types a previous run wrote into the generated block"""
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(_TYPES_PREFIX):
+                    return {value.strip() for value in line[len(_TYPES_PREFIX):].split(",")} & set(PROJECT_IGNORES)
+    except OSError:
+        pass
+    return set()
+
+def measure_context(context_dir: str, matchers: Dict[str, IgnoreMatcher]) -> Dict[str, Any]:
+    """Bytes and files of context_dir, in total and as left by each ignore matcher"""
+    totals = {"bytes": 0, "files": 0}
+    kept = {name: {"bytes": 0, "files": 0} for name in matchers}
+    for root, dirs, files in os.walk(context_dir):
+        rel_root = os.path.relpath(root, context_dir).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root + "/"
+        for name in files:
+            try:
+                size = os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+            rel_path = rel_root + name
+            totals["bytes"] += size
+            totals["files"] += 1
+            for key, matcher in matchers.items():
+                if not matcher.ignored(rel_path):
+                    kept[key]["bytes"] += size
+                    kept[key]["files"] += 1
+    return {"before": totals, "after": kept}
+
+def prune_build_context(context_dir: str, project_type: str = None) -> Dict[str, Any]:
+    """Generate or merge .dockerignore and .s2iignore for context_dir.
+
+    Ignore sets are chosen from project_type (e.g. RepoAnalysis.project_type),
+    the manifests found in context_dir and the types recorded by earlier runs.
+    Returns the file actions and the context size before and after pruning
+    for docker and s2i builds.
+    """
+    dockerignore = os.path.join(context_dir, ".dockerignore")
+    s2iignore = os.path.join(context_dir, ".s2iignore")
+
+    project_types = detect_project_types(context_dir) | _recorded_types(dockerignore)
+    analyzed_type = normalize_project_type(project_type)
+    if analyzed_type:
+        project_types.add(analyzed_type)
+    project_types = sorted(project_types)
+
+    patterns = list(COMMON_IGNORES)
+    for key in project_types:
+        patterns += [pattern for pattern in PROJECT_IGNORES[key] if pattern not in patterns]
+
+    files = {}
+    if BUILD_CONTEXT_PRUNE:
+        files[".dockerignore"] = _merge_ignore_file(dockerignore, patterns, project_types)
+        files[".s2iignore"] = _merge_ignore_file(s2iignore, _s2i_patterns(patterns), project_types)
+
+    sizes = measure_context(context_dir, {
+        "docker": IgnoreMatcher(parse_ignore_file(dockerignore)),
+        # s2i does not support negation, so "!" lines are skipped
+        "s2i": IgnoreMatcher([line for line in parse_ignore_file(s2iignore) if not line.startswith("!")])
+    })
+    return {
+        "enabled": BUILD_CONTEXT_PRUNE,
+        "project_types": project_types,
+        "files": files,
+        "context_bytes_before": sizes["before"]["bytes"],
+        "context_files_before": sizes["before"]["files"],
+        "docker_context_bytes": sizes["after"]["docker"]["bytes"],
+        "docker_context_files": sizes["after"]["docker"]["files"],
+        "s2i_context_bytes": sizes["after"]["s2i"]["bytes"],
+        "s2i_context_files": sizes["after"]["s2i"]["files"]
+    }
@@ -0,0 +1,326 @@
+import asyncio
+import os
+import time
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+from command_runner import run_command, CommandResult
+from resource_limits import BUILD_CPUS, BUILD_MEMORY, HOST_RESERVED_CPUS, HOST_RESERVED_MEMORY, available_memory
+
+# Comma separated DOCKER_HOST values (unix:///..., tcp://host:2376, npipe:////./pipe/...).
+# Empty means the single daemon docker would use by default.
+DOCKER_ENDPOINTS = os.getenv("DOCKER_ENDPOINTS", "")
+# Docker CLI used for scheduled builds; point it at a shim script to test without real daemons
+DOCKER_BIN = os.getenv("DOCKER_BIN", "docker")
+HEALTH_TTL = float(os.getenv("DOCKER_HEALTH_TTL", "30"))
+MAX_BUILDS_PER_HOST = int(os.getenv("MAX_BUILDS_PER_HOST", "2"))
+# How long a build waits for a host with enough headroom before giving up
+ADMISSION_TIMEOUT = float(os.getenv("ADMISSION_TIMEOUT", "600"))
+# Headroom is re-checked this often while waiting, since memory frees up outside the scheduler
+ADMISSION_POLL = float(os.getenv("ADMISSION_POLL", "5"))
+
+# Errors the docker and s2i CLIs print, before anything else, when they cannot
+# reach their daemon. Only the first line of stderr is checked: build steps
+# write to stderr too, and a RUN step failing with "connection refused" is a
+# failed build, not an unreachable daemon.
+_HOST_FAILURE_MARKERS = (
+    "cannot connect to the docker daemon",
+    "error during connect",
+    "unable to connect to docker daemon"
+)
+
+def configured_endpoints() -> List[Optional[str]]:
+    """Docker endpoints from DOCKER_ENDPOINTS; [None] means the default daemon"""
+    endpoints = [endpoint.strip() for endpoint in DOCKER_ENDPOINTS.split(",") if endpoint.strip()]
+    return endpoints or [None]
+
+def docker_env(docker_host: Optional[str]) -> Optional[Dict[str, str]]:
+    """Environment that points docker/s2i at docker_host, or None to inherit"""
+    if not docker_host:
+        return None
+    env = dict(os.environ)
+    env["DOCKER_HOST"] = docker_host
+    return env
+
+def is_host_failure(result: CommandResult) -> bool:
+    """True when a failed command looks like it could not reach its docker daemon.
+
+    BuildScheduler.run() confirms this with a fresh health check before
+    giving up on the host.
+    """
+    if result.ok:
+        return False
+    first_line = next((line.strip().lower() for line in result.stderr.splitlines() if line.strip()), "")
+    return any(marker in first_line for marker in _HOST_FAILURE_MARKERS)
+
+class DockerHost:
+    """One docker endpoint with its load, health and known images"""
+
+    def __init__(self, docker_host: Optional[str], docker_command: str = DOCKER_BIN):
+        self.docker_host = docker_host
+        self.name = docker_host or "default"
+        self.docker_command = docker_command
+        self.active_builds = 0
+        self.healthy = None
+        self.last_error = None
+        self.checked_at = 0.0
+        self.completed_builds = 0
+        self.failures = 0
+        self.cached_images = set()
+        # Reported by `docker info`; None until the first health check
+        self.ncpu = None
+        self.mem_total = None
+        # Health check in flight, shared by concurrent callers
+        self.probe = None
+
+    @property
+    def env(self) -> Optional[Dict[str, str]]:
+        return docker_env(self.docker_host)
+
+    def docker(self, *args: str) -> List[str]:
+        """Build a docker command line for this host"""
+        return [self.docker_command] + list(args)
+
+    def mark_unhealthy(self, error: str):
+        self.healthy = False
+        self.last_error = error
+        self.checked_at = time.monotonic()
+        self.failures += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "active_builds": self.active_builds,
+            "completed_builds": self.completed_builds,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "cached_images": sorted(self.cached_images),
+            "ncpu": self.ncpu,
+            "mem_total": self.mem_total,
+            "reserved_cpus": self.active_builds * BUILD_CPUS,
+            "reserved_memory": self.active_builds * BUILD_MEMORY
+        }
+
+class NoHealthyHostError(Exception):
+    """No docker endpoint is reachable"""
+
+class AdmissionTimeoutError(Exception):
+    """No docker endpoint had headroom for another build within ADMISSION_TIMEOUT"""
+
+class BuildScheduler:
+    """Places builds on the least loaded healthy docker endpoint.
+
+    Hosts that already hold the build's base/builder image are preferred so
+    layers are reused. A build is only admitted to a host whose CPUs and
+    memory, less HOST_RESERVED_*, cover the BUILD_CPUS/BUILD_MEMORY of every
+    build on it including the new one. A build that fails because its daemon
+    is unreachable marks the host unhealthy and is retried on the next best host.
+    """
+
+    def __init__(self, endpoints: List[Optional[str]] = None, docker_command: str = DOCKER_BIN,
+                 max_builds_per_host: int = MAX_BUILDS_PER_HOST):
+        self.hosts = [DockerHost(endpoint, docker_command) for endpoint in (endpoints or configured_endpoints())]
+        self.max_builds_per_host = max_builds_per_host
+        self.admission_waits = 0
+        self._changed = None
+
+    @property
+    def local_only(self) -> bool:
+        return len(self.hosts) == 1 and self.hosts[0].docker_host is None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    async def check_health(self, host: DockerHost, refresh: bool = False) -> bool:
+        """Probe a host with `docker info`, reusing the answer for HEALTH_TTL seconds"""
+        if not refresh and host.healthy is not None and time.monotonic() - host.checked_at < HEALTH_TTL:
+            return host.healthy
+        # Concurrent admissions share one probe of a host instead of each running docker info
+        if host.probe is None or host.probe.done():
+            host.probe = asyncio.ensure_future(self._probe_health(host))
+        return await asyncio.shield(host.probe)
+
+    async def _probe_health(self, host: DockerHost) -> bool:
+        try:
+            result = await run_command(
+                host.docker("info", "--format", "{{.ServerVersion}} {{.NCPU}} {{.MemTotal}}"),
+                timeout=10, group="docker", env=host.env
+            )
+            if result.ok:
+                fields = result.stdout.split()
+                if len(fields) == 3 and fields[1].isdigit() and fields[2].isdigit():
+                    host.ncpu, host.mem_total = int(fields[1]), int(fields[2])
+                host.healthy = True
+                host.last_error = None
+                host.checked_at = time.monotonic()
+            else:
+                host.mark_unhealthy(result.stderr.strip() or "docker info failed")
+        except FileNotFoundError:
+            host.mark_unhealthy("Docker not installed")
+        return host.healthy
+
+    async def has_image(self, host: DockerHost, image: str) -> bool:
+        """Whether the host already has image locally (positive answers are remembered)"""
+        if not image:
+            return False
+        if image in host.cached_images:
+            return True
+        try:
+            result = await run_command(host.docker("image", "inspect", "--format", "{{.Id}}", image),
+                                       timeout=10, group="docker", env=host.env)
+        except FileNotFoundError:
+            return False
+        if result.ok:
+            host.cached_images.add(image)
+        return result.ok
+
+    def has_headroom(self, host: DockerHost) -> bool:
+        """Whether host can take one more build within its CPU and memory budget"""
+        # An idle host always takes one build, even if it is smaller than the budget
+        if not host.active_builds:
+            return True
+        builds = host.active_builds + 1
+        if host.ncpu and BUILD_CPUS and builds * BUILD_CPUS > host.ncpu - HOST_RESERVED_CPUS:
+            return False
+        if host.mem_total and BUILD_MEMORY and builds * BUILD_MEMORY > host.mem_total - HOST_RESERVED_MEMORY:
+            return False
+        # The local daemon's live memory also counts what runs outside the scheduler
+        if host.docker_host is None and BUILD_MEMORY:
+            available = available_memory()
+            if available is not None and available < BUILD_MEMORY + HOST_RESERVED_MEMORY:
+                return False
+        return True
+
+    async def any_healthy(self) -> bool:
+        results = await asyncio.gather(*(self.check_health(host) for host in self.hosts))
+        return any(results)
+
+    def _is_free(self, host: DockerHost) -> bool:
+        return host.active_builds < self.max_builds_per_host and self.has_headroom(host)
+
+    async def _probe(self, image: Optional[str], exclude: set) -> List[Tuple[DockerHost, bool]]:
+        """(healthy host, whether it has image) for the candidate hosts.
+
+        Runs docker subprocesses, so it is called without holding the
+        scheduler's condition lock. Hosts still being health checked are left
+        out once another healthy host has room for the build.
+        """
+        order = {host.name: index for index, host in enumerate(self.hosts)}
+        checks = {
+            asyncio.ensure_future(self.check_health(host)): host
+            for host in self.hosts if host.name not in exclude
+        }
+        healthy = []
+        pending = set(checks)
+        # Stop waiting for slow health checks once a probed host could take the build
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            healthy += [checks[check] for check in done if check.result()]
+            if any(self._is_free(host) for host in healthy):
+                break
+        for check in pending:
+            # The shared probe itself keeps running and updates the host
+            check.cancel()
+        healthy.sort(key=lambda host: order[host.name])
+        # Only hosts that could take the build now are asked for the image
+        cached = await asyncio.gather(*(
+            self.has_image(host, image) if self._is_free(host) else asyncio.sleep(0, False)
+            for host in healthy
+        ))
+        return list(zip(healthy, cached))
+
+    def _choose(self, probed: List[Tuple[DockerHost, bool]]) -> Optional[DockerHost]:
+        """Best free host of a probe: affinity first, then least loaded, then configuration order"""
+        free = [(index, host, cached) for index, (host, cached) in enumerate(probed) if self._is_free(host)]
+        if not free:
+            return None
+        return min(free, key=lambda item: (not item[2], item[1].active_builds, item[0]))[1]
+
+    async def acquire(self, image: str = None, exclude: set = frozenset()) -> DockerHost:
+        """Reserve a build slot on the best host, waiting while all healthy hosts are full.
+
+        Hosts are probed outside the condition lock; the lock is only held to
+        choose a host and count the build on it, so a slow or unreachable
+        endpoint does not hold up admissions and releases on other hosts.
+        """
+        condition = self._condition()
+        deadline = time.monotonic() + ADMISSION_TIMEOUT
+        waited = False
+        while True:
+            probed = await self._probe(image, exclude)
+            if not probed:
+                raise NoHealthyHostError("No healthy docker endpoint available")
+            async with condition:
+                host = self._choose(probed)
+                if host is not None:
+                    host.active_builds += 1
+                    return host
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AdmissionTimeoutError(
+                        f"No docker endpoint had headroom for another build within {ADMISSION_TIMEOUT:g}s"
+                    )
+                if not waited:
+                    self.admission_waits += 1
+                    waited = True
+                try:
+                    await asyncio.wait_for(condition.wait(), min(ADMISSION_POLL, remaining))
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, host: DockerHost, succeeded: bool = False, images: List[str] = ()):
+        """Free a build slot; images are now known to be cached on the host"""
+        host.active_builds -= 1
+        if succeeded:
+            host.completed_builds += 1
+            host.cached_images.update(image for image in images if image)
+        condition = self._condition()
+        async with condition:
+            condition.notify_all()
+
+    async def run(self, build: Callable[[DockerHost], Awaitable[Dict[str, Any]]], image: str = None,
+                  produced_images: List[str] = ()) -> Dict[str, Any]:
+        """Run build(host) on the best host, moving to another host if the daemon fails.
+
+        build returns the usual result dict; it sets "host_failure" to signal
+        that its daemon seemed unreachable. If a fresh health check of the
+        host fails too, the build is placed elsewhere.
+        """
+        tried = set()
+        last_result = None
+        while len(tried) < len(self.hosts):
+            try:
+                host = await self.acquire(image, exclude=tried)
+            except NoHealthyHostError as e:
+                if last_result is not None:
+                    return last_result
+                return {"error": str(e), "docker_hosts": self.status()}
+            except AdmissionTimeoutError as e:
+                return {"error": str(e), "timed_out": True, "docker_hosts": self.status()}
+            tried.add(host.name)
+            succeeded = False
+            try:
+                result = await build(host)
+                # Only a host that also fails a fresh health check is given up on
+                if result.pop("host_failure", False) and not await self.check_health(host, refresh=True):
+                    last_result = result
+                    continue
+                succeeded = bool(result.get("success"))
+                result["docker_host"] = host.name
+                return result
+            finally:
+                await self.release(host, succeeded, [image] + list(produced_images))
+        return last_result or {"error": "No healthy docker endpoint available", "docker_hosts": self.status()}
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [host.to_dict() for host in self.hosts]
+
+_scheduler = None
+
+def get_build_scheduler() -> BuildScheduler:
+    """Return the process-wide build scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = BuildScheduler()
+    return _scheduler
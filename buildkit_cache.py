@@ -0,0 +1,287 @@
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+from typing import Dict, Any, List, Optional, Tuple
+from command_runner import run_command, DOCKER_CLI_TIMEOUT
+from build_scheduler import MAX_BUILDS_PER_HOST
+from resource_limits import BUILD_PIDS, builder_driver_opts, legacy_build_args
+
+# BUILDKIT_CACHE=0 falls back to a plain `docker build`
+BUILDKIT_CACHE = os.getenv("BUILDKIT_CACHE", "1") != "0"
+# BUILDKIT_CACHE_MOUNTS=0 leaves RUN instructions of Dockerfiles untouched
+BUILDKIT_CACHE_MOUNTS = os.getenv("BUILDKIT_CACHE_MOUNTS", "1") != "0"
+BUILD_CACHE_DIR = os.getenv("BUILD_CACHE_DIR", "build_cache")
+BUILDX_BUILDER_PREFIX = "agentic-ai"
+
+# Package manager commands and the cache directories they fill, as root
+PACKAGE_MANAGER_CACHES = [
+    ("pip", re.compile(r"\bpip3?\s+install\b|\bpython3?\s+-m\s+pip\s+install\b"), ["/root/.cache/pip"]),
+    ("npm", re.compile(r"\bnpm\s+(ci|install|i)\b"), ["/root/.npm"]),
+    ("yarn", re.compile(r"\byarn(\s+install)?\s*($|&&|;)"), ["/usr/local/share/.cache/yarn"]),
+    ("pnpm", re.compile(r"\bpnpm\s+(install|i)\b"), ["/root/.local/share/pnpm/store"]),
+    ("go", re.compile(r"\bgo\s+(build|mod\s+download|install)\b"), ["/root/.cache/go-build", "/go/pkg/mod"]),
+    ("maven", re.compile(r"\bmvnw?\b|\./mvnw\b"), ["/root/.m2"]),
+    ("gradle", re.compile(r"\bgradlew?\b"), ["/root/.gradle"])
+]
+
+_STEP_PATTERN = re.compile(r"^#(\d+) \[(?:[^\]\s]+ )?\d+/\d+\]", re.MULTILINE)
+_CACHED_PATTERN = re.compile(r"^#(\d+) CACHED\s*$", re.MULTILINE)
+
+_builders: Dict[str, Optional[str]] = {}
+_builder_locks: Dict[str, asyncio.Lock] = {}
+# Problems setting up a host's builder, reported with its builds
+_builder_warnings: Dict[str, List[str]] = {}
+_cache_locks: Dict[str, asyncio.Lock] = {}
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-") or "default"
+
+def cache_dir_for(image_name: str) -> str:
+    """Local BuildKit cache directory of a project, keyed by its image name"""
+    return os.path.abspath(os.path.join(BUILD_CACHE_DIR, _slug(image_name.split(":")[0])))
+
+def _instructions(lines: List[str]) -> List[Tuple[int, int]]:
+    """(first line, last line) of each instruction, following backslash continuations"""
+    spans = []
+    index = 0
+    while index < len(lines):
+        start = index
+        while lines[index].rstrip().endswith("\\") and index + 1 < len(lines):
+            index += 1
+        spans.append((start, index))
+        index += 1
+    return spans
+
+def add_cache_mounts(dockerfile: str) -> Tuple[str, List[str]]:
+    """Give package manager RUN instructions a BuildKit cache mount.
+
+    Only RUN instructions executed as root are changed, since the cache
+    directories are root's. Instructions that already mount a cache are
+    left alone. Returns the new text and the package managers found.
+    """
+    lines = dockerfile.splitlines()
+    managers = []
+    user = None
+    for start, end in _instructions(lines):
+        stripped = lines[start].lstrip()
+        keyword = stripped.split(None, 1)[0].upper() if stripped else ""
+        if keyword == "FROM":
+            user = None
+        elif keyword == "USER":
+            user = stripped.split(None, 1)[1].strip() if len(stripped.split(None, 1)) > 1 else None
+        if keyword != "RUN" or user not in (None, "root", "0"):
+            continue
+        instruction = " ".join(line.rstrip("\\") for line in lines[start:end + 1])
+        if "--mount=type=cache" in instruction:
+            continue
+        targets = []
+        for name, pattern, directories in PACKAGE_MANAGER_CACHES:
+            if pattern.search(instruction):
+                managers.append(name)
+                targets += directories
+        if targets:
+            indent = lines[start][:len(lines[start]) - len(stripped)]
+            mounts = " ".join(f"--mount=type=cache,target={target}" for target in targets)
+            lines[start] = f"{indent}{stripped[:3]} {mounts}{stripped[3:]}"
+
+    if not managers:
+        return dockerfile, []
+    # No "# syntax=" line: the built-in frontend supports RUN --mount, and a
+    # syntax line would make every build pull a frontend image
+    return "\n".join(lines) + "\n", sorted(set(managers))
+
+async def _ensure_builder(host) -> Optional[str]:
+    """docker-container buildx builder for host, needed for local cache export.
+
+    The builder container is capped at the host's build budget (CPU and
+    memory through driver options, pids through `docker update`). Its name
+    includes a digest of those limits, so changed limits get a new builder;
+    builders of the host with an older digest are removed then, so they do
+    not hold resources outside build admission. Returns "" when the docker CLI has no buildx plugin and None when the
+    builder could not be set up. Creation is serialized per host.
+    """
+    if host.name in _builders:
+        return _builders[host.name]
+    # Concurrent first builds on a host would otherwise all try to create the builder
+    async with _builder_locks.setdefault(host.name, asyncio.Lock()):
+        if host.name in _builders:
+            return _builders[host.name]
+        return await _create_builder(host)
+
+async def _builder_names(host) -> List[str]:
+    """Names of the buildx builders known to host's docker CLI"""
+    result = await run_command(host.docker("buildx", "ls"), timeout=DOCKER_CLI_TIMEOUT, group="docker", env=host.env)
+    if not result.ok:
+        return []
+    # Builder lines start at column 0; their nodes are indented below them
+    return [
+        line.split()[0].rstrip("*") for line in result.stdout.splitlines()[1:]
+        if line.strip() and not line[0].isspace()
+    ]
+
+async def _remove_stale_builders(host, current: str) -> List[str]:
+    """Remove this host's builders that were created for other limits"""
+    prefix = f"{BUILDX_BUILDER_PREFIX}-{_slug(host.name)}-"
+    warnings = []
+    for name in await _builder_names(host):
+        # The digest must follow the prefix directly, or "tcp-a-" would match host "tcp://a-b"
+        if name != current and name.startswith(prefix) and re.fullmatch(r"[0-9a-f]{8}", name[len(prefix):]):
+            removed = await run_command(host.docker("buildx", "rm", name), timeout=DOCKER_CLI_TIMEOUT,
+                                        group="docker", env=host.env)
+            if not removed.ok:
+                warnings.append(f"Could not remove stale builder {name}: {removed.stderr.strip()[-300:]}")
+    return warnings
+
+async def _create_builder(host) -> Optional[str]:
+    driver_opts = builder_driver_opts(MAX_BUILDS_PER_HOST)
+    pids_limit = BUILD_PIDS * MAX_BUILDS_PER_HOST
+    digest = hashlib.sha256(" ".join(driver_opts + [str(pids_limit)]).encode()).hexdigest()[:8]
+    name = f"{BUILDX_BUILDER_PREFIX}-{_slug(host.name)}-{digest}"
+    warnings = []
+    try:
+        version = await run_command(host.docker("buildx", "version"), timeout=DOCKER_CLI_TIMEOUT,
+                                    group="docker", env=host.env)
+        if not version.ok:
+            _builders[host.name] = ""
+            return ""
+        inspect = await run_command(host.docker("buildx", "inspect", name), timeout=DOCKER_CLI_TIMEOUT,
+                                    group="docker", env=host.env)
+        if not inspect.ok:
+            create = await run_command(
+                host.docker("buildx", "create", "--name", name, "--driver", "docker-container",
+                            *driver_opts, "--bootstrap"),
+                timeout=DOCKER_CLI_TIMEOUT, group="docker", env=host.env
+            )
+            if not create.ok:
+                # Not remembered, so an unreachable host is retried next time
+                return None
+            if pids_limit:
+                # buildx names the container of a builder's first node buildx_buildkit_<name>0
+                update = await run_command(
+                    host.docker("update", "--pids-limit", str(pids_limit), f"buildx_buildkit_{name}0"),
+                    timeout=DOCKER_CLI_TIMEOUT, group="docker", env=host.env
+                )
+                if not update.ok:
+                    warnings.append(f"pids limit not applied to builder {name}: {update.stderr.strip()[-300:]}")
+        warnings += await _remove_stale_builders(host, name)
+    except FileNotFoundError:
+        return None
+    _builders[host.name] = name
+    _builder_warnings[host.name] = warnings
+    return name
+
+def _cache_mount_dockerfile(directory_path: str, cache_dir: str) -> Tuple[List[str], List[str]]:
+    """-f arguments for a variant of the project's Dockerfile with cache mounts added"""
+    try:
+        with open(os.path.join(directory_path, "Dockerfile")) as f:
+            original = f.read()
+    except OSError:
+        return [], []
+    rewritten, managers = add_cache_mounts(original)
+    if not managers:
+        return [], []
+    # The project's Dockerfile stays untouched; the variant lives next to the cache
+    os.makedirs(os.path.dirname(cache_dir), exist_ok=True)
+    variant = f"{cache_dir}.Dockerfile"
+    with open(variant, "w") as f:
+        f.write(rewritten)
+    return ["-f", variant], managers
+
+async def build_command(host, directory_path: str, image_name: str, labels: List[str]) -> Tuple[List[str], Dict[str, Any]]:
+    """docker build command line for host, with BuildKit caching where available.
+
+    Returns the command and cache details for the build result. With a
+    buildx builder the project's local cache is imported and exported in
+    full (mode=max) to a staging directory that commit_cache() swaps in.
+    Without buildx this is a plain `docker build`.
+    """
+    label_args = [arg for label in labels for arg in ("--label", label)]
+    builder = await _ensure_builder(host) if BUILDKIT_CACHE else ""
+    if not builder:
+        mode = "unavailable" if builder is None else ("disabled" if not BUILDKIT_CACHE else "no-buildx")
+        return host.docker("build", *label_args, *legacy_build_args(), "-t", image_name, directory_path), {"mode": mode}
+
+    cache_dir = cache_dir_for(image_name)
+    info: Dict[str, Any] = {"mode": "local", "builder": builder, "cache_dir": cache_dir}
+    if _builder_warnings.get(host.name):
+        info["builder_warnings"] = list(_builder_warnings[host.name])
+    dockerfile_args = []
+    if BUILDKIT_CACHE_MOUNTS:
+        dockerfile_args, managers = _cache_mount_dockerfile(directory_path, cache_dir)
+        if managers:
+            info["cache_mounts"] = managers
+
+    # Leftovers of a failed export would otherwise be swapped in with the next one
+    await asyncio.to_thread(shutil.rmtree, f"{cache_dir}.new", True)
+    imported = os.path.exists(os.path.join(cache_dir, "index.json"))
+    cache_from = ["--cache-from", f"type=local,src={cache_dir}"] if imported else []
+    info["imported"] = imported
+    return host.docker(
+        "buildx", "build", "--builder", builder, "--progress=plain", "--load",
+        *cache_from, "--cache-to", f"type=local,dest={cache_dir}.new,mode=max",
+        *label_args, *dockerfile_args, "-t", image_name, directory_path
+    ), info
+
+def cache_lock(image_name: str) -> asyncio.Lock:
+    """Serializes builds sharing a project cache directory"""
+    return _cache_locks.setdefault(cache_dir_for(image_name), asyncio.Lock())
+
+def commit_cache(info: Dict[str, Any]):
+    """Replace the project cache with the one just exported.
+
+    The local exporter only ever adds blobs, so swapping in the fresh export
+    keeps the cache at the size of the latest build.
+    """
+    if info.get("mode") != "local":
+        return
+    cache_dir = info["cache_dir"]
+    staged = cache_dir + ".new"
+    if not os.path.exists(os.path.join(staged, "index.json")):
+        return
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(staged, cache_dir)
+
+class CacheStatsCounter:
+    """Counts build steps and those BuildKit served from cache in --progress=plain output.
+
+    Output is fed as it streams in (e.g. from run_command(on_output=...)),
+    so the build log does not have to be kept in memory.
+    """
+
+    def __init__(self):
+        self.steps = set()
+        self.cached = set()
+        self._partial = ""
+
+    def _line(self, line: str):
+        step = _STEP_PATTERN.match(line)
+        if step:
+            self.steps.add(step.group(1))
+        cached = _CACHED_PATTERN.match(line)
+        if cached:
+            self.cached.add(cached.group(1))
+
+    def feed(self, text: str):
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line)
+
+    def stats(self) -> Dict[str, Any]:
+        if self._partial:
+            self._line(self._partial)
+            self._partial = ""
+        cached = self.steps.intersection(self.cached)
+        return {
+            "steps": len(self.steps),
+            "cached_steps": len(cached),
+            "hit_rate": round(len(cached) / len(self.steps), 3) if self.steps else None
+        }
+
+def parse_cache_stats(output: str) -> Dict[str, Any]:
+    """Cache statistics of a complete --progress=plain build output"""
+    counter = CacheStatsCounter()
+    counter.feed(output)
+    return counter.stats()
@@ -0,0 +1,204 @@
+import asyncio
+import codecs
+import os
+import signal
+import subprocess
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Callable
+
+# Default timeouts in seconds, overridable from the environment
+GIT_TIMEOUT = int(os.getenv("GIT_TIMEOUT", "300"))
+BUILD_TIMEOUT = int(os.getenv("BUILD_TIMEOUT", "1800"))
+DOCKER_CLI_TIMEOUT = int(os.getenv("DOCKER_CLI_TIMEOUT", "120"))
+# How long to keep reading output after a command exits; processes it left
+# behind that still hold its stdout/stderr are killed after that
+OUTPUT_DRAIN_TIMEOUT = float(os.getenv("OUTPUT_DRAIN_TIMEOUT", "2"))
+# Characters of each stream kept in the result when output is streamed to on_output
+STREAMED_OUTPUT_TAIL = int(os.getenv("STREAMED_OUTPUT_TAIL", str(64 * 1024)))
+
+# Maximum number of commands running at once per group. A group named
+# "<name>:<key>" (e.g. "build:<docker host>") has its own semaphore with the
+# limit of <name>, so builds are limited per docker host.
+CONCURRENCY_LIMITS = {
+    "git": int(os.getenv("GIT_CONCURRENCY", "4")),
+    "build": int(os.getenv("BUILD_CONCURRENCY", "2")),
+    "docker": int(os.getenv("DOCKER_CONCURRENCY", "8")),
+    "default": int(os.getenv("COMMAND_CONCURRENCY", "8"))
+}
+
+# Semaphores are bound to an event loop, so keep one set per loop
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+@dataclass
+class CommandResult:
+    """Outcome of an external command run through run_command()"""
+    args: List[str]
+    returncode: Optional[int]
+    stdout: str = ""
+    stderr: str = ""
+    duration: float = 0.0
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "args": self.args,
+            "returncode": self.returncode,
+            "duration": round(self.duration, 3),
+            "timed_out": self.timed_out
+        }
+
+class _OutputBuffer:
+    """Text of one output stream, keeping only the last max_chars if given"""
+
+    def __init__(self, max_chars: Optional[int] = None):
+        self.max_chars = max_chars
+        self.chunks: List[str] = []
+        self.size = 0
+
+    def append(self, text: str):
+        self.chunks.append(text)
+        self.size += len(text)
+        # Trimmed in batches so long outputs are not re-joined on every chunk
+        if self.max_chars is not None and self.size > 2 * self.max_chars:
+            self.chunks = [self.text()]
+            self.size = len(self.chunks[0])
+
+    def text(self) -> str:
+        text = "".join(self.chunks)
+        return text if self.max_chars is None else text[-self.max_chars:]
+
+def _semaphore(group: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    groups = _semaphores.setdefault(loop, {})
+    if group not in groups:
+        limit = CONCURRENCY_LIMITS.get(group.split(":", 1)[0], CONCURRENCY_LIMITS["default"])
+        groups[group] = asyncio.Semaphore(limit)
+    return groups[group]
+
+def _kill_process_group(proc: asyncio.subprocess.Process, leftovers: bool = False):
+    """Kill the command and everything it started.
+
+    With leftovers the group is killed even though the command itself has
+    already exited, to stop processes it left running.
+    """
+    if proc.returncode is not None and not leftovers:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], capture_output=True)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+async def _exited(proc: asyncio.subprocess.Process):
+    """Wait until the process itself exits.
+
+    Before Python 3.12, Process.wait() also waits for the pipes to close,
+    which never happens while a background child still holds them.
+    """
+    waiter = asyncio.ensure_future(proc.wait())
+    delay = 0.01
+    try:
+        while not waiter.done() and proc.returncode is None:
+            await asyncio.wait({waiter}, timeout=delay)
+            delay = min(delay * 2, 0.2)
+    finally:
+        waiter.cancel()
+
+async def _pump(stream: asyncio.StreamReader, buffer: _OutputBuffer, on_output: Optional[Callable[[str], None]]):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        data = await stream.read(64 * 1024)
+        if not data:
+            text = decoder.decode(b"", final=True)
+        else:
+            text = decoder.decode(data)
+        if text:
+            buffer.append(text)
+            if on_output:
+                on_output(text)
+        if not data:
+            return
+
+async def run_command(args: List[str], timeout: Optional[float] = None, group: str = "default",
+                      cwd: str = None, env: Dict[str, str] = None,
+                      on_output: Optional[Callable[[str], None]] = None) -> CommandResult:
+    """Run an external command without blocking the event loop.
+
+    The command runs in its own process group, which is killed on timeout or
+    when the awaiting task is cancelled. The command is done when it exits;
+    output is then drained for up to OUTPUT_DRAIN_TIMEOUT seconds, so
+    background processes holding its pipes do not stall or time it out.
+    At most CONCURRENCY_LIMITS[group]
+    commands of a group run at once. on_output receives stdout and stderr
+    text as it arrives; the result then only keeps the last
+    STREAMED_OUTPUT_TAIL characters of each stream, since the full output
+    went to on_output. Raises FileNotFoundError if the executable is missing.
+    """
+    if os.name == "posix":
+        group_kwargs = {"start_new_session": True}
+    else:
+        group_kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+    async with _semaphore(group):
+        started = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            env=env,
+            **group_kwargs
+        )
+        tail = STREAMED_OUTPUT_TAIL if on_output else None
+        stdout_buffer = _OutputBuffer(tail)
+        stderr_buffer = _OutputBuffer(tail)
+        timed_out = False
+        pumps = asyncio.gather(
+            _pump(proc.stdout, stdout_buffer, on_output),
+            _pump(proc.stderr, stderr_buffer, on_output)
+        )
+        try:
+            await asyncio.wait_for(_exited(proc), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            _kill_process_group(proc)
+            await _exited(proc)
+        except asyncio.CancelledError:
+            _kill_process_group(proc)
+            # Reap the process so its transport is closed while the loop still runs
+            await asyncio.gather(pumps, proc.wait(), return_exceptions=True)
+            raise
+        try:
+            await asyncio.wait_for(asyncio.shield(pumps), OUTPUT_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Something the command started still holds its pipes open
+            _kill_process_group(proc, leftovers=True)
+            try:
+                await asyncio.wait_for(pumps, OUTPUT_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+        if pumps.done():
+            await proc.wait()
+
+        return CommandResult(
+            args=[str(arg) for arg in args],
+            returncode=proc.returncode,
+            stdout=stdout_buffer.text(),
+            stderr=stderr_buffer.text() + (f"\nCommand timed out after {timeout}s" if timed_out else ""),
+            duration=time.monotonic() - started,
+            timed_out=timed_out
+        )
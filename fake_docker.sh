@@ -0,0 +1,64 @@
+#!/bin/sh
+# Stand-in for the docker CLI, for trying the build scheduler, reclaimer and
+# prewarm without real daemons:
+#
+#   DOCKER_BIN=$PWD/fake_docker.sh DOCKER_ENDPOINTS=tcp://a,tcp://b,tcp://dead python main.py
+#
+# Each DOCKER_HOST is a separate fake daemon. Tunables:
+#   FAKE_DOCKER_DOWN     substring of DOCKER_HOST values that are unreachable (default "dead")
+#   FAKE_DOCKER_NCPU     CPUs reported by `docker info` (default 8)
+#   FAKE_DOCKER_MEM      memory in bytes reported by `docker info` (default 16 GiB)
+#   FAKE_DOCKER_IMAGES   space separated images every daemon already has
+#   FAKE_DOCKER_BUILD_SECONDS  duration of a build (default 1)
+#   FAKE_DOCKER_BUILDX   set to 1 to pretend the buildx plugin is installed
+
+host="${DOCKER_HOST:-default}"
+down="${FAKE_DOCKER_DOWN:-dead}"
+
+case "$host" in
+    *"$down"*)
+        echo "Cannot connect to the Docker daemon at $host. Is the docker daemon running?" >&2
+        exit 1;;
+esac
+
+fake_build() {
+    echo "#1 [internal] load build definition from Dockerfile"
+    echo "#2 [1/2] FROM base"
+    echo "#2 CACHED"
+    sleep "${FAKE_DOCKER_BUILD_SECONDS:-1}"
+    echo "#3 [2/2] COPY . ."
+    echo "#3 DONE 0.1s"
+}
+
+case "$1" in
+    info)
+        echo "24.0.0 ${FAKE_DOCKER_NCPU:-8} ${FAKE_DOCKER_MEM:-17179869184}";;
+    version)
+        echo "24.0.0";;
+    build)
+        fake_build >&2;;
+    buildx)
+        [ "$FAKE_DOCKER_BUILDX" = "1" ] || { echo "docker: 'buildx' is not a docker command." >&2; exit 1; }
+        case "$2" in
+            build) fake_build >&2;;
+            inspect) echo "Name: $3";;
+            ls) echo "NAME/NODE DRIVER/ENDPOINT STATUS";;
+        esac;;
+    image)
+        # image inspect --format ... <image>
+        for arg; do image="$arg"; done
+        for known in $FAKE_DOCKER_IMAGES; do
+            [ "$known" = "$image" ] && { echo "0 1"; exit 0; }
+        done
+        echo "Error: No such image: $image" >&2
+        exit 1;;
+    run)
+        echo "fakecontainer$$";;
+    pull)
+        echo "Pulled ${2}";;
+    ps|images)
+        ;;
+    *)
+        ;;
+esac
+exit 0
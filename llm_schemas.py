@@ -0,0 +1,57 @@
+import json
+import re
+from typing import Dict, Any, List, Optional
+from pydantic import BaseModel, Field, field_validator
+
+class RepoAnalysis(BaseModel):
+    """Structured repository analysis returned by /analyze-repo"""
+    project_type: str = Field(description="Detected framework/language, e.g. 'python-flask'")
+    main_files: List[str] = Field(default_factory=list, description="Important files of the project")
+    dependencies: List[str] = Field(default_factory=list, description="Detected dependencies")
+    recommended_port: int = Field(default=8080, description="Port the application listens on")
+    build_instructions: str = Field(default="", description="How to build this project")
+    runtime_requirements: str = Field(default="", description="What is needed to run this project")
+
+class S2IConfig(BaseModel):
+    """S2I build configuration recommended by the model"""
+    builder_image: str = Field(
+        default="registry.redhat.io/ubi9/python-311",
+        description="S2I builder image, e.g. registry.redhat.io/ubi9/python-311"
+    )
+    output_image: str = Field(default="ai-generated-app", description="Name for the built image")
+    environment_vars: Dict[str, str] = Field(default_factory=dict, description="Environment variables for the build")
+
+    @field_validator("output_image")
+    @classmethod
+    def _docker_image_name(cls, value: str) -> str:
+        # Docker repository names must be lowercase [a-z0-9._-]
+        name = re.sub(r"[^a-z0-9._/-]+", "-", value.strip().lower()).strip("-._/")
+        return name or "ai-generated-app"
+
+    @field_validator("environment_vars", mode="before")
+    @classmethod
+    def _stringify_env(cls, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {str(key): str(val) for key, val in value.items()}
+        return value
+
+def extract_json(text: str) -> Optional[Any]:
+    """Pull the first JSON object out of a model reply.
+
+    Handles markdown code fences and prose before or after the JSON.
+    Returns None when the text holds no decodable object.
+    """
+    if not text:
+        return None
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    candidates = [fenced.group(1)] if fenced else []
+    candidates.append(text)
+    decoder = json.JSONDecoder()
+    for candidate in candidates:
+        for match in re.finditer(r"\{", candidate):
+            try:
+                value, _ = decoder.raw_decode(candidate[match.start():])
+                return value
+            except ValueError:
+                continue
+    return None
@@ -0,0 +1,210 @@
+import asyncio
+import gzip
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Iterator, AsyncIterator, Callable
+
+LOG_STORE_DIR = os.getenv("LOG_STORE_DIR", "build_logs")
+TAIL_LINES = int(os.getenv("LOG_TAIL_LINES", "20"))
+TAIL_CHARS = 4000
+# Finalized logs older than LOG_MAX_AGE seconds, or beyond the LOG_KEEP newest, are pruned
+LOG_MAX_AGE = int(os.getenv("LOG_MAX_AGE", str(7 * 24 * 3600)))
+LOG_KEEP = int(os.getenv("LOG_KEEP", "1000"))
+
+_LOG_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9-]{0,80}$")
+
+def tail_text(text: str, max_lines: int = TAIL_LINES, max_chars: int = TAIL_CHARS) -> str:
+    """Return the last few lines of a log, capped in size, for JSON responses"""
+    if not text:
+        return ""
+    tail = "\n".join(text.rstrip("\n").splitlines()[-max_lines:])
+    return tail[-max_chars:]
+
+class LogStore:
+    """Compressed on-disk store for clone and build logs.
+
+    A log is written to ``<id>.log`` while its job is running and compressed
+    to ``<id>.log.gz`` once finalized. Readers can fetch byte or line ranges
+    of either form, or follow a live log until it is finalized.
+    """
+
+    def __init__(self, root: str = LOG_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        # Open handles of live logs, so appending a chunk does not reopen the file
+        self._handles: Dict[str, Any] = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    def _live_path(self, log_id: str) -> str:
+        return os.path.join(self.root, f"{log_id}.log")
+
+    def _archive_path(self, log_id: str) -> str:
+        return os.path.join(self.root, f"{log_id}.log.gz")
+
+    def _check_id(self, log_id: str):
+        if not _LOG_ID_PATTERN.match(log_id or ""):
+            raise ValueError(f"Invalid log id '{log_id}'")
+
+    def create(self, kind: str = "build") -> str:
+        """Start a new live log and return its id"""
+        log_id = f"{re.sub(r'[^a-z0-9]+', '-', kind.lower()).strip('-') or 'log'}-{uuid.uuid4().hex[:12]}"
+        handle = open(self._live_path(log_id), "w", encoding="utf-8")
+        with self._lock:
+            self._handles[log_id] = handle
+        return log_id
+
+    def append(self, log_id: str, text: str):
+        """Append text to a live log"""
+        self._check_id(log_id)
+        if not text:
+            return
+        with self._lock:
+            handle = self._handles.get(log_id)
+            if handle is None:
+                handle = self._handles[log_id] = open(self._live_path(log_id), "a", encoding="utf-8")
+            handle.write(text)
+            # Flushed right away so follow() sees the output as it arrives
+            handle.flush()
+
+    def finalize(self, log_id: str):
+        """Compress a live log; it stays readable under the same id.
+
+        Blocking; call it through asyncio.to_thread() from the event loop.
+        Only closing the handle holds the lock, so other logs keep streaming
+        while this one is compressed.
+        """
+        self._check_id(log_id)
+        live_path = self._live_path(log_id)
+        with self._lock:
+            handle = self._handles.pop(log_id, None)
+            if handle is not None:
+                handle.close()
+        if not os.path.exists(live_path):
+            return
+        tmp_path = self._archive_path(log_id) + ".tmp"
+        with open(live_path, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, self._archive_path(log_id))
+        os.remove(live_path)
+
+    def save(self, kind: str, text: str) -> str:
+        """Write a complete log in one go and return its id"""
+        log_id = self.create(kind)
+        self.append(log_id, text)
+        self.finalize(log_id)
+        return log_id
+
+    def start_command_log(self, kind: str, cmd: list) -> str:
+        """Start a live log for a command; stream output into it with append()"""
+        log_id = self.create(kind)
+        self.append(log_id, f"$ {' '.join(str(part) for part in cmd)}\n")
+        return log_id
+
+    def writer(self, log_id: str) -> Callable[[str], None]:
+        """Return a callback that appends to the given log, for run_command(on_output=...)"""
+        return lambda text: self.append(log_id, text)
+
+    def exists(self, log_id: str) -> bool:
+        self._check_id(log_id)
+        return self.is_live(log_id) or os.path.exists(self._archive_path(log_id))
+
+    def is_live(self, log_id: str) -> bool:
+        self._check_id(log_id)
+        return os.path.exists(self._live_path(log_id))
+
+    def _open(self, log_id: str):
+        self._check_id(log_id)
+        # Check the archive first: finalize() writes it before removing the live file
+        if os.path.exists(self._archive_path(log_id)):
+            return gzip.open(self._archive_path(log_id), "rb")
+        if os.path.exists(self._live_path(log_id)):
+            return open(self._live_path(log_id), "rb")
+        raise FileNotFoundError(f"Log '{log_id}' not found")
+
+    def read_bytes(self, log_id: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Return bytes [start, end) of the uncompressed log"""
+        with self._open(log_id) as f:
+            f.seek(start)
+            if end is None:
+                return f.read()
+            return f.read(max(0, end - start))
+
+    def read_lines(self, log_id: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Return lines [start, end) of the log"""
+        selected = []
+        with self._open(log_id) as f:
+            for number, line in enumerate(f):
+                if end is not None and number >= end:
+                    break
+                if number >= start:
+                    selected.append(line)
+        return b"".join(selected)
+
+    def _read_from(self, log_id: str, offset: int = 0) -> Iterator[bytes]:
+        """Yield whatever is currently available after offset"""
+        with self._open(log_id) as f:
+            f.seek(offset)
+            while True:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+
+    def prune(self, max_age: int = LOG_MAX_AGE, keep: int = LOG_KEEP, dry_run: bool = False) -> List[Dict[str, Any]]:
+        """Remove finalized logs that are expired or beyond the newest keep.
+
+        Live logs are never removed. Returns the removed (or, with dry_run,
+        removable) logs with their compressed size.
+        """
+        archives = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".log.gz"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                archives.append((stat.st_mtime, entry.name[:-len(".log.gz")], stat.st_size))
+        archives.sort(reverse=True)
+
+        now = time.time()
+        removed = []
+        for index, (mtime, log_id, size) in enumerate(archives):
+            if now - mtime > max_age:
+                reason = "expired"
+            elif index >= keep:
+                reason = "count"
+            else:
+                continue
+            if not dry_run:
+                try:
+                    os.remove(self._archive_path(log_id))
+                except OSError:
+                    continue
+            removed.append({"log_id": log_id, "bytes": size, "reason": reason})
+        return removed
+
+    async def follow(self, log_id: str, offset: int = 0, poll_interval: float = 0.5) -> AsyncIterator[bytes]:
+        """Stream a log from offset, waiting for new output until it is finalized"""
+        while True:
+            live = self.is_live(log_id)
+            for chunk in self._read_from(log_id, offset):
+                offset += len(chunk)
+                yield chunk
+            if not live:
+                return
+            await asyncio.sleep(poll_interval)
+
+_store = None
+
+def get_log_store() -> LogStore:
+    """Return the process-wide log store"""
+    global _store
+    if _store is None:
+        _store = LogStore()
+    return _store
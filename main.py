@@ -1,17 +1,70 @@
+import asyncio
+import json
 import os
 import shutil
-import subprocess
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, HttpUrl
-import uvicorn
-from awsbedrock import BedrockDockerAgent, bedrock_s2i_containerize
+from prewarm import start_prewarm, get_warmup_state
+from command_runner import run_command, GIT_TIMEOUT
+from log_store import get_log_store, tail_text
+from reclaimer import get_reclaimer
+from profiling import (
+    should_profile, begin_spans, span, server_timing_header,
+    start_profile, finish_profile, load_profile, folded_text
+)
+from repo_tree import fetch_repo_tree
+from build_context import prune_build_context
+from prebuild import (
+    WEBHOOK_SECRET, get_prebuild_cache, get_prebuild_queue, verify_signature, push_event,
+    workspace_commit, workspace_origin, run_prebuilt_image
+)
+from bedrock_sessions import begin_usage, get_session_manager
 
-app = FastAPI(title="Git Repo Analyzer & Containerizer", version="1.0.0")
+# awsbedrock (and with it boto3) is imported inside the handlers so the app can
+# bind its port quickly; the lifespan pre-warm loads it in the background.
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background pre-warming, disk reclamation and prebuilds without delaying startup"""
+    prewarm_task = start_prewarm()
+    reclaim_task = asyncio.create_task(get_reclaimer().run_periodically())
+    prebuild_task = asyncio.create_task(get_prebuild_queue().run())
+    yield
+    for task in (prewarm_task, reclaim_task, prebuild_task):
+        if task and not task.done():
+            task.cancel()
+
+app = FastAPI(title="Git Repo Analyzer & Containerizer", version="1.0.0", lifespan=lifespan)
+
+@app.middleware("http")
+async def profiling_middleware(request: Request, call_next):
+    """Report stage spans via Server-Timing and profile opted-in or sampled requests"""
+    started = time.perf_counter()
+    spans = begin_spans()
+    profiler = start_profile() if should_profile(request.headers) else None
+    try:
+        response = await call_next(request)
+    except Exception:
+        if profiler:
+            finish_profile(profiler, {"method": request.method, "path": request.url.path}, spans, started)
+        raise
+    if spans:
+        response.headers["Server-Timing"] = server_timing_header(spans)
+    if profiler:
+        profile_id = finish_profile(
+            profiler,
+            {"method": request.method, "path": request.url.path, "status_code": response.status_code},
+            spans,
+            started
+        )
+        response.headers["X-Profile-Id"] = profile_id
+    return response
 
 # Setup templates
 templates = Jinja2Templates(directory="templates")
@@ -23,9 +76,19 @@ Path(CLONED_REPOS_DIR).mkdir(exist_ok=True)
 class RepoRequest(BaseModel):
     repo_url: HttpUrl
 
+class AnalyzeRequest(RepoRequest):
+    tree_only: bool = False  # analyze from a partial clone without checking out files
+
 class ContainerizeRequest(BaseModel):
     project_name: str
 
+class ServicesRequest(BaseModel):
+    project_name: str
+    analyze: bool = True  # run a Bedrock analysis per service
+
+class FollowUpRequest(BaseModel):
+    question: str
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Serve the main HTML page"""
@@ -41,91 +104,140 @@ async def clone_repository(repo_request: RepoRequest) -> Dict[str, Any]:
         repo_name = repo_url.split('/')[-1].replace('.git', '')
         clone_path = os.path.join(CLONED_REPOS_DIR)
         
-        # Remove existing directory if it exists
-        if os.path.exists(clone_path):
-            shutil.rmtree(clone_path)
+        with get_reclaimer().in_use(workspaces=[clone_path]):
+            # Remove existing directory if it exists
+            if os.path.exists(clone_path):
+                await asyncio.to_thread(shutil.rmtree, clone_path)
+            
+            # Clone repository
+            clone_cmd = ["git", "clone", repo_url, clone_path]
+            store = get_log_store()
+            clone_log_id = store.start_command_log("git-clone", clone_cmd)
+            try:
+                with span("git_clone"):
+                    result = await run_command(clone_cmd, timeout=GIT_TIMEOUT, group="git", on_output=store.writer(clone_log_id))
+            finally:
+                await asyncio.to_thread(store.finalize, clone_log_id)
+            # A new checkout starts a new conversation about the workspace
+            get_session_manager().drop(os.path.abspath(clone_path))
         
-        # Clone repository
-        result = subprocess.run(
-            ["git", "clone", repo_url, clone_path],
-            capture_output=True,
-            text=True,
-            timeout=300
-        )
-        
-        if result.returncode != 0:
+        if result.timed_out:
+            raise HTTPException(status_code=408, detail="Clone operation timed out")
+        if not result.ok:
             raise HTTPException(
                 status_code=400,
-                detail=f"Git clone failed: {result.stderr}"
+                detail=f"Git clone failed: {tail_text(result.stderr)} (log: {clone_log_id})"
             )
         
         return {
             "success": True,
             "message": f"Repository cloned successfully to {clone_path}",
             "repo_name": repo_name,
-            "clone_path": clone_path
+            "clone_path": clone_path,
+            "clone_log_id": clone_log_id
         }
         
-    except subprocess.TimeoutExpired:
-        raise HTTPException(status_code=408, detail="Clone operation timed out")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Clone failed: {str(e)}")
 
 @app.post("/analyze-repo")
-async def analyze_repository(repo_request: RepoRequest) -> Dict[str, Any]:
+async def analyze_repository(repo_request: AnalyzeRequest) -> Dict[str, Any]:
     """Analyze repository using AWS Bedrock and return details"""
+    from awsbedrock import get_bedrock_agent, StructuredOutputError
+    from llm_schemas import RepoAnalysis
+    usage = begin_usage()
     try:
         repo_url = str(repo_request.repo_url)
         repo_name = repo_url.split('/')[-1].replace('.git', '')
-        project_path = os.path.abspath(os.path.join(os.getcwd(),CLONED_REPOS_DIR))
-        print(project_path)
-        if not os.path.exists(project_path):
-            raise HTTPException(
-                status_code=404,
-                detail=f"Repository not found. Please clone it first."
-            )
-        # Initialize Bedrock agent
-        agent = BedrockDockerAgent()
+        # Reuse the shared Bedrock agent
+        agent = await asyncio.to_thread(get_bedrock_agent)
         
-        # Analyze project structure
-        project_info = agent._analyze_project_structure(project_path)
+        if repo_request.tree_only:
+            # Partial clone: only trees and manifest blobs are transferred
+            with span("partial_clone"):
+                tree = await fetch_repo_tree(repo_url)
+            if "error" in tree:
+                raise HTTPException(status_code=400, detail=tree["error"])
+            project_path = None
+            with span("project_structure"):
+                project_info = agent._analyze_project_structure(repo_name, tree_paths=tree["paths"])
+            manifests = tree["manifests"]
+            session_key = f"{repo_url}@{tree['commit']}"
+            acquisition = {
+                "mode": "tree-only",
+                "commit": tree["commit"],
+                "file_count": len(tree["paths"]),
+                "transfer_bytes": tree["transfer_bytes"]
+            }
+        else:
+            project_path = os.path.abspath(os.path.join(os.getcwd(),CLONED_REPOS_DIR))
+            if not os.path.exists(project_path):
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Repository not found. Please clone it first."
+                )
+            # Analyze project structure
+            with get_reclaimer().in_use(workspaces=[project_path]), span("project_structure"):
+                project_info = await asyncio.to_thread(agent._analyze_project_structure, project_path)
+            manifests = {}
+            acquisition = {"mode": "checkout", "commit": await workspace_commit(project_path)}
+            session_key = project_path
         
-        # Get AI analysis
-        prompt = f"""
-        Analyze this repository and provide a detailed summary:
+        # The structure and manifests open the workspace conversation, so
+        # follow-up requests reuse them as a cached prefix
+        session = agent.workspace_session(repo_name, project_info, manifests, key=session_key)
         
-        Repository: {repo_name}
-        Project Structure:
-        {project_info}
+        # A webhook prebuild may already have analyzed this commit
+        commit = acquisition.get("commit")
+        prebuilt = get_prebuild_cache().get(repo_url, commit) if commit else None
         
-        Please provide analysis in JSON format with:
-        {{
-            "project_type": "detected framework/language",
-            "main_files": ["list of important files"],
-            "dependencies": ["detected dependencies"],
-            "recommended_port": 8080,
-            "build_instructions": "how to build this project",
-            "runtime_requirements": "what's needed to run this"
-        }}
-        """
+        if prebuilt and prebuilt.get("analysis"):
+            analysis = RepoAnalysis.model_validate(prebuilt["analysis"])
+            llm_meta = {"source": "prebuild", "prebuilt_at": prebuilt.get("finished_at")}
+        else:
+            # Get AI analysis
+            try:
+                with span("bedrock"):
+                    analysis, llm_meta = await asyncio.to_thread(agent.analyze_repository, repo_name, session)
+            except StructuredOutputError as e:
+                raise HTTPException(status_code=502, detail=f"Analysis failed: {str(e)}")
         
-        ai_response = agent._call_bedrock(prompt)
+        # Prepare the checkout's ignore files for the detected project type
+        build_context = None
+        services = None
+        if project_path:
+            from monorepo import discover_services
+            services = await asyncio.to_thread(discover_services, project_path)
+            with get_reclaimer().in_use(workspaces=[project_path]), span("prune_context"):
+                build_context = await asyncio.to_thread(prune_build_context, project_path, analysis.project_type)
         
         return {
             "success": True,
             "repo_name": repo_name,
             "project_path": project_path,
+            "acquisition": acquisition,
             "structure": project_info,
-            "ai_analysis": ai_response,
-            "bedrock_model": agent.model_id
+            "ai_analysis": analysis.model_dump(),
+            "ai_output": llm_meta,
+            "build_context": build_context,
+            "services": services,
+            "bedrock_model": agent.model_id,
+            "bedrock_usage": usage,
+            "session": session.to_dict()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 @app.post("/containerize")
 async def containerize_project(container_request: ContainerizeRequest) -> Dict[str, Any]:
     """Create containerized image using AWS Bedrock S2I method"""
+    from awsbedrock import bedrock_s2i_containerize
+    usage = begin_usage()
     try:
         project_name = container_request.project_name
         project_path = os.path.join(CLONED_REPOS_DIR)
@@ -136,8 +248,20 @@ async def containerize_project(container_request: ContainerizeRequest) -> Dict[s
                 detail=f"Project '{project_path}' not found in cloned repositories"
             )
         
-        # Use Bedrock S2I containerization
-        result = bedrock_s2i_containerize(project_path)
+        with get_reclaimer().in_use(workspaces=[project_path]):
+            # Start the image a webhook prebuild made for this commit if there is one
+            result = None
+            commit = await workspace_commit(project_path)
+            origin = await workspace_origin(project_path)
+            prebuilt = get_prebuild_cache().get(origin, commit) if commit and origin else None
+            if prebuilt and prebuilt.get("image"):
+                result = await run_prebuilt_image(prebuilt)
+                if "error" in result:
+                    result = None
+            
+            # Use Bedrock S2I containerization
+            if result is None:
+                result = await bedrock_s2i_containerize(project_path)
         
         if "error" in result:
             raise HTTPException(status_code=500, detail=result["error"])
@@ -146,7 +270,8 @@ async def containerize_project(container_request: ContainerizeRequest) -> Dict[s
             "success": True,
             "message": f"Containerization completed for {project_name}",
             "project_name": project_name,
-            "containerization_result": result
+            "containerization_result": result,
+            "bedrock_usage": usage
         }
         
     except HTTPException:
@@ -154,10 +279,150 @@ async def containerize_project(container_request: ContainerizeRequest) -> Dict[s
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Containerization failed: {str(e)}")
 
+@app.post("/containerize-services")
+async def containerize_services_endpoint(services_request: ServicesRequest) -> Dict[str, Any]:
+    """Build one image per service of a monorepo, in parallel"""
+    from monorepo import containerize_services
+    usage = begin_usage()
+    project_path = os.path.abspath(CLONED_REPOS_DIR)
+    if not os.path.exists(project_path):
+        raise HTTPException(status_code=404, detail="Repository not found. Please clone it first.")
+    try:
+        with get_reclaimer().in_use(workspaces=[project_path]):
+            result = await containerize_services(project_path, services_request.project_name, services_request.analyze)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Containerization failed: {str(e)}")
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    result["bedrock_usage"] = usage
+    return result
+
+@app.post("/follow-up")
+async def follow_up(follow_up_request: FollowUpRequest) -> Dict[str, Any]:
+    """Ask a further question about the cloned repository in its ongoing conversation"""
+    from awsbedrock import get_bedrock_agent
+    usage = begin_usage()
+    project_path = os.path.abspath(CLONED_REPOS_DIR)
+    if not os.path.exists(project_path):
+        raise HTTPException(status_code=404, detail="Repository not found. Please clone it first.")
+    try:
+        agent = await asyncio.to_thread(get_bedrock_agent)
+        with get_reclaimer().in_use(workspaces=[project_path]):
+            session = await asyncio.to_thread(agent.workspace_session, project_path)
+            with span("bedrock"):
+                answer = await asyncio.to_thread(agent._call_bedrock, follow_up_request.question, session)
+        return {
+            "success": True,
+            "answer": answer,
+            "session": session.to_dict(),
+            "bedrock_usage": usage
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Follow-up failed: {str(e)}")
+
+@app.post("/webhooks/push")
+async def push_webhook(request: Request) -> Dict[str, Any]:
+    """Queue a background prebuild of the analysis and image for a pushed commit"""
+    if not WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Webhook is not configured (set WEBHOOK_SECRET)")
+    body = await request.body()
+    if not verify_signature(body, request.headers.get("x-hub-signature-256")):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    
+    event = request.headers.get("x-github-event", "push")
+    if event == "ping":
+        return {"success": True, "message": "pong"}
+    if event != "push":
+        return {"success": True, "queued": False, "reason": f"Ignored '{event}' event"}
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Payload is not valid JSON")
+    push = push_event(payload)
+    if push is None:
+        return {"success": True, "queued": False, "reason": "Not a branch push"}
+    result = get_prebuild_queue().enqueue(push)
+    result["success"] = True
+    return result
+
+@app.get("/prebuilds")
+async def list_prebuilds() -> Dict[str, Any]:
+    """Queued, running and finished webhook prebuilds"""
+    return {
+        "queue": get_prebuild_queue().status(),
+        "prebuilds": get_prebuild_cache().list()
+    }
+
+@app.get("/logs/{log_id}")
+async def get_log(log_id: str, start: int = 0, end: Optional[int] = None,
+                  unit: str = "bytes", follow: bool = False):
+    """Read a stored clone/build log by byte or line range, or follow it live"""
+    store = get_log_store()
+    if unit not in ("bytes", "lines"):
+        raise HTTPException(status_code=400, detail="unit must be 'bytes' or 'lines'")
+    if start < 0 or (end is not None and end < start):
+        raise HTTPException(status_code=400, detail="Invalid range")
+    try:
+        if not store.exists(log_id):
+            raise HTTPException(status_code=404, detail=f"Log '{log_id}' not found")
+        if follow:
+            if unit != "bytes":
+                raise HTTPException(status_code=400, detail="follow mode only supports byte offsets")
+            return StreamingResponse(store.follow(log_id, start), media_type="text/plain")
+        if unit == "lines":
+            content = store.read_lines(log_id, start, end)
+        else:
+            content = store.read_bytes(log_id, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return PlainTextResponse(
+        content.decode("utf-8", errors="replace"),
+        headers={"X-Log-Live": str(store.is_live(log_id)).lower()}
+    )
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "json"):
+    """Fetch a stored request profile as JSON or folded stacks for flame graphs"""
+    try:
+        profile = load_profile(profile_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+    if format == "folded":
+        return PlainTextResponse(folded_text(profile))
+    return profile
+
+@app.get("/admin/reclaim")
+async def reclaim_stats() -> Dict[str, Any]:
+    """Reclaimed bytes and counts since startup, tracked resources and quotas"""
+    return get_reclaimer().get_stats()
+
+@app.post("/admin/reclaim")
+async def reclaim_now(dry_run: bool = False) -> Dict[str, Any]:
+    """Run a reclamation pass immediately; dry_run only reports what would be removed"""
+    return await get_reclaimer().reclaim(dry_run=dry_run)
+
+@app.get("/admin/build-hosts")
+async def build_hosts() -> Dict[str, Any]:
+    """Docker endpoints known to the build scheduler with their load and health"""
+    from build_scheduler import get_build_scheduler
+    scheduler = get_build_scheduler()
+    return {"hosts": scheduler.status(), "admission_waits": scheduler.admission_waits}
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "service": "Git Repo Analyzer & Containerizer"}
+    """Health check endpoint, including pre-warm readiness"""
+    warmup = get_warmup_state()
+    return {
+        "status": "healthy",
+        "service": "Git Repo Analyzer & Containerizer",
+        "ready": warmup["ready"],
+        "failed_steps": warmup["failed_steps"],
+        "warmup": warmup
+    }
 
 @app.exception_handler(404)
 async def not_found_handler(request: Request, exc: HTTPException):
@@ -174,6 +439,7 @@ async def internal_error_handler(request: Request, exc: HTTPException):
     )
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
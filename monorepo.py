@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import re
+from typing import Dict, Any, List, Optional
+from project_layout import skip_dir, dockerfile_base_image, detect_builder_image
+
+# awsbedrock and s2i_builder are imported where they are used so that
+# importing this module stays cheap.
+
+# Files that make a directory a deployable unit
+SERVICE_MARKERS = (
+    "Dockerfile", "requirements.txt", "pyproject.toml", "setup.py", "Pipfile",
+    "package.json", "pom.xml", "build.gradle", "build.gradle.kts", "go.mod"
+)
+# Directories holding documentation, tests or samples, whose manifests are not services
+NON_SERVICE_DIRS = {"docs", "doc", "test", "tests", "example", "examples", "samples"}
+MONOREPO_MAX_DEPTH = int(os.getenv("MONOREPO_MAX_DEPTH", "3"))
+MONOREPO_MAX_SERVICES = int(os.getenv("MONOREPO_MAX_SERVICES", "20"))
+# Bedrock analyses running at once; image builds are limited by the build scheduler
+MONOREPO_ANALYSIS_CONCURRENCY = int(os.getenv("MONOREPO_ANALYSIS_CONCURRENCY", "4"))
+
+def _service_name(rel_path: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", rel_path.lower()).strip("-") or "root"
+
+def _read(path: str) -> str:
+    try:
+        with open(path, errors="replace") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+def _is_workspace_root(root: str, names: set) -> bool:
+    """Whether the root manifests only tie together packages below it"""
+    if names.intersection({"pnpm-workspace.yaml", "lerna.json"}):
+        return True
+    if "package.json" in names:
+        try:
+            package = json.loads(_read(os.path.join(root, "package.json")))
+        except ValueError:
+            package = {}
+        if isinstance(package, dict) and package.get("workspaces"):
+            return True
+    if "pom.xml" in names and "<modules>" in _read(os.path.join(root, "pom.xml")):
+        return True
+    for settings in ("settings.gradle", "settings.gradle.kts"):
+        if settings in names and re.search(r"^\s*include\b", _read(os.path.join(root, settings)), re.MULTILINE):
+            return True
+    return False
+
+def discover_services(root: str) -> List[Dict[str, Any]]:
+    """Find the deployable units of a repository.
+
+    A directory with a Dockerfile or a dependency manifest is a service and
+    is not searched further, so its own subdirectories stay part of it.
+    Documentation, test and example directories are not searched. The root
+    is a service when it has its own Dockerfile or manifest, unless that
+    manifest only declares a workspace (npm/pnpm/lerna workspaces, Maven
+    modules, Gradle includes) and services were found below it. Service
+    names are unique; clashes get a numeric suffix.
+    """
+    found = []
+    pending = [("", 0)]
+    while pending and len(found) < MONOREPO_MAX_SERVICES:
+        rel_dir, depth = pending.pop(0)
+        path = os.path.join(root, rel_dir) if rel_dir else root
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            continue
+        if rel_dir and any(name in SERVICE_MARKERS for name in names):
+            found.append(rel_dir)
+            continue
+        if depth < MONOREPO_MAX_DEPTH:
+            pending.extend(
+                (f"{rel_dir}/{name}" if rel_dir else name, depth + 1)
+                for name in names
+                if not skip_dir(name) and name.lower() not in NON_SERVICE_DIRS
+                and os.path.isdir(os.path.join(path, name))
+            )
+
+    root_names = set(os.listdir(root)) if os.path.isdir(root) else set()
+    if "Dockerfile" in root_names or (
+        root_names.intersection(SERVICE_MARKERS) and not (found and _is_workspace_root(root, root_names))
+    ):
+        found.insert(0, "")
+
+    services = []
+    taken = set()
+    for rel_dir in found:
+        path = os.path.join(root, rel_dir) if rel_dir else root
+        dockerfile = os.path.join(path, "Dockerfile")
+        if os.path.exists(dockerfile):
+            builder, base_image = "docker", dockerfile_base_image(dockerfile)
+        else:
+            builder, base_image = "s2i", detect_builder_image(path)
+        # services/a_b and services/a-b would otherwise share a name
+        base_name = name = _service_name(rel_dir)
+        suffix = 2
+        while name in taken:
+            name = f"{base_name}-{suffix}"
+            suffix += 1
+        taken.add(name)
+        services.append({
+            "name": name,
+            "path": rel_dir or ".",
+            "builder": builder if base_image or builder == "docker" else None,
+            "base_image": base_image
+        })
+    return services
+
+async def _analyze_service(agent, root: str, service: Dict[str, Any], repo_name: str,
+                           limit: asyncio.Semaphore) -> Dict[str, Any]:
+    """Bedrock analysis of one service from its own directory and conversation"""
+    path = os.path.abspath(os.path.join(root, service["path"]))
+    async with limit:
+        try:
+            session = await asyncio.to_thread(agent.workspace_session, path)
+            analysis, meta = await asyncio.to_thread(
+                agent.analyze_repository, f"{repo_name}/{service['path']}", session
+            )
+            return {"analysis": analysis.model_dump(), "ai_output": meta}
+        except Exception as e:
+            return {"analysis_error": str(e)}
+
+async def _build_service(root: str, service: Dict[str, Any], image_name: str) -> Dict[str, Any]:
+    """Build one service image without starting a container"""
+    from awsbedrock import build_and_run_docker
+    from s2i_builder import containerize_with_s2i
+
+    path = os.path.abspath(os.path.join(root, service["path"]))
+    if service["builder"] == "docker":
+        return await build_and_run_docker(path, image_name, run_container=False)
+    if service["builder"] == "s2i":
+        return await containerize_with_s2i(path, service["base_image"], image_name, run_container=False)
+    return {"skipped": "No Dockerfile and no recognised manifest for an S2I builder"}
+
+async def _build_group(root: str, group: List[Dict[str, Any]], image_names: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """Build services sharing a base image: one first, then the rest in parallel.
+
+    The first build pulls the base image; the scheduler then knows which
+    host holds it and places the remaining builds there.
+    """
+    first, rest = group[0], group[1:]
+    results = {first["name"]: await _build_service(root, first, image_names[first["name"]])}
+    built = await asyncio.gather(*(_build_service(root, service, image_names[service["name"]]) for service in rest))
+    results.update({service["name"]: result for service, result in zip(rest, built)})
+    return results
+
+def _build_summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    keys = ("success", "error", "skipped", "docker_host", "build_duration", "build_log_id", "log_id", "build_context", "build_cache", "timed_out")
+    return {key: result[key] for key in keys if key in result}
+
+async def containerize_services(root: str, project_name: str, analyze: bool = True) -> Dict[str, Any]:
+    """Discover the services of a repository, analyze each and build one image per service"""
+    from awsbedrock import get_bedrock_agent
+
+    if not os.path.exists(root):
+        return {"error": f"Directory '{root}' not found"}
+
+    services = await asyncio.to_thread(discover_services, root)
+    if not services:
+        return {"error": "No deployable services found"}
+
+    prefix = _service_name(project_name)
+    image_names = {
+        service["name"]: prefix if service["path"] == "." else f"{prefix}-{service['name']}"
+        for service in services
+    }
+
+    analyses = {}
+    if analyze:
+        agent = await asyncio.to_thread(get_bedrock_agent)
+        limit = asyncio.Semaphore(MONOREPO_ANALYSIS_CONCURRENCY)
+        results = await asyncio.gather(*(
+            _analyze_service(agent, root, service, project_name, limit) for service in services
+        ))
+        analyses = {service["name"]: result for service, result in zip(services, results)}
+
+    # Group by base/builder image so each group's base layers are pulled once
+    groups: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for service in services:
+        groups.setdefault(service["base_image"], []).append(service)
+    builds = {}
+    for group_results in await asyncio.gather(*(_build_group(root, group, image_names) for group in groups.values())):
+        builds.update(group_results)
+
+    per_service = []
+    for service in services:
+        build = builds[service["name"]]
+        entry = dict(service, image=image_names[service["name"]] if build.get("success") else None,
+                     build=_build_summary(build))
+        entry.update(analyses.get(service["name"], {}))
+        per_service.append(entry)
+
+    built = sum(1 for entry in per_service if entry["build"].get("success"))
+    # Libraries and other units without a way to build them are reported, not failed
+    skipped = sum(1 for entry in per_service if "skipped" in entry["build"])
+    return {
+        "success": built > 0 and built + skipped == len(per_service),
+        "services": per_service,
+        "summary": {
+            "total": len(per_service),
+            "built": built,
+            "skipped": skipped,
+            "failed": len(per_service) - built - skipped,
+            "base_images": sorted(image for image in groups if image)
+        }
+    }
@@ -0,0 +1,318 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from command_runner import run_command, GIT_TIMEOUT, DOCKER_CLI_TIMEOUT
+from log_store import get_log_store, tail_text
+from reclaimer import get_reclaimer, MANAGED_LABEL, SERVICE_STATE_DIR
+from build_scheduler import get_build_scheduler
+from resource_limits import container_run_args
+
+# awsbedrock and s2i_builder are imported by the worker so that importing this
+# module from main.py stays cheap.
+
+# Shared secret configured on the webhook; without it pushes are rejected
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+PREBUILD_DIR = os.getenv("PREBUILD_DIR", "prebuild_workspaces")
+PREBUILD_QUEUE_SIZE = int(os.getenv("PREBUILD_QUEUE_SIZE", "20"))
+PREBUILD_KEEP = int(os.getenv("PREBUILD_KEEP", "200"))
+# Prebuilds wait while interactive builds run, polling every PREBUILD_IDLE_POLL
+# seconds for at most PREBUILD_MAX_DEFER seconds per stage
+PREBUILD_IDLE_POLL = float(os.getenv("PREBUILD_IDLE_POLL", "2"))
+PREBUILD_MAX_DEFER = float(os.getenv("PREBUILD_MAX_DEFER", "600"))
+
+_ZERO_COMMIT = "0" * 40
+
+def verify_signature(body: bytes, signature: Optional[str], secret: str = None) -> bool:
+    """Check a GitHub style X-Hub-Signature-256 header ("sha256=<hex hmac>")"""
+    secret = WEBHOOK_SECRET if secret is None else secret
+    if not secret or not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256="):])
+
+def push_event(payload: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """repo_url, branch and commit of a branch push; None for tags, deletions and other payloads"""
+    ref = payload.get("ref") or ""
+    commit = payload.get("after") or ""
+    repository = payload.get("repository") or {}
+    # GitHub sends clone_url, GitLab git_http_url, plain payloads may just give url
+    repo_url = repository.get("clone_url") or repository.get("git_http_url") or repository.get("url")
+    if not ref.startswith("refs/heads/") or not repo_url or not re.fullmatch(r"[0-9a-f]{40}", commit):
+        return None
+    if commit == _ZERO_COMMIT:
+        return None
+    return {"repo_url": repo_url, "branch": ref[len("refs/heads/"):], "commit": commit}
+
+def repo_key(repo_url: str) -> str:
+    """Normalize a repository URL so clone and web URLs of one repo compare equal"""
+    key = repo_url.strip().rstrip("/")
+    if key.endswith(".git"):
+        key = key[:-4]
+    return key.lower()
+
+def _slug(repo_url: str) -> str:
+    name = repo_key(repo_url).split("/")[-1]
+    return re.sub(r"[^a-z0-9]+", "-", name).strip("-") or "repo"
+
+async def workspace_commit(path: str) -> Optional[str]:
+    """Commit checked out in a workspace, or None if it is not a git checkout"""
+    try:
+        result = await run_command(["git", "rev-parse", "HEAD"], timeout=30, group="git", cwd=path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return result.stdout.strip() if result.ok else None
+
+async def workspace_origin(path: str) -> Optional[str]:
+    """URL the workspace was cloned from"""
+    try:
+        result = await run_command(["git", "config", "--get", "remote.origin.url"], timeout=30, group="git", cwd=path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return result.stdout.strip() if result.ok else None
+
+class PrebuildCache:
+    """Prebuild results per repository commit, kept in a small JSON file"""
+
+    def __init__(self, state_dir: str = SERVICE_STATE_DIR):
+        self.path = os.path.join(state_dir, "prebuilds.json")
+        os.makedirs(state_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+        # Prebuilds cut short by a restart can be queued again
+        for entry in self._entries.values():
+            if entry.get("status") == "running":
+                entry["status"] = "interrupted"
+
+    def _save(self):
+        # Drop the oldest results beyond PREBUILD_KEEP
+        if len(self._entries) > PREBUILD_KEEP:
+            ordered = sorted(self._entries.items(), key=lambda item: item[1].get("queued_at", 0))
+            self._entries = dict(ordered[-PREBUILD_KEEP:])
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, repo_url: str, commit: str) -> Optional[Dict[str, Any]]:
+        """Finished prebuild of commit, if any"""
+        with self._lock:
+            entry = self._entries.get(f"{repo_key(repo_url)}@{commit}")
+        return dict(entry) if entry and entry.get("status") == "ready" else None
+
+    def put(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[f"{repo_key(entry['repo_url'])}@{entry['commit']}"] = dict(entry)
+            self._save()
+
+    def status_of(self, repo_url: str, commit: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(f"{repo_key(repo_url)}@{commit}")
+        return entry.get("status") if entry else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return sorted(self._entries.values(), key=lambda entry: entry.get("queued_at", 0), reverse=True)
+
+class PrebuildQueue:
+    """Runs prebuilds one at a time in the background.
+
+    Pending work is keyed by repository and branch, so a newer push replaces
+    a prebuild that has not started yet. Build stages wait while interactive
+    builds hold the build scheduler, so prebuilds only use idle capacity.
+    """
+
+    def __init__(self, cache: PrebuildCache = None):
+        self.cache = cache or get_prebuild_cache()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._queue = None
+        self.current = None
+
+    def _get_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def enqueue(self, push: Dict[str, str]) -> Dict[str, Any]:
+        """Queue a prebuild for a push; returns what happened to it"""
+        status = self.cache.status_of(push["repo_url"], push["commit"])
+        if status in ("ready", "running"):
+            return {"queued": False, "reason": f"commit already {status}", "commit": push["commit"]}
+
+        key = f"{repo_key(push['repo_url'])}#{push['branch']}"
+        job = dict(push, queued_at=time.time())
+        if key in self._pending:
+            superseded = self._pending[key]["commit"]
+            self._pending[key] = job
+            return {"queued": True, "commit": push["commit"], "superseded": superseded}
+        if len(self._pending) >= PREBUILD_QUEUE_SIZE:
+            return {"queued": False, "reason": "prebuild queue is full", "commit": push["commit"]}
+        self._pending[key] = job
+        self._get_queue().put_nowait(key)
+        return {"queued": True, "commit": push["commit"], "position": len(self._pending)}
+
+    async def run(self):
+        """Worker loop, started from the app lifespan"""
+        queue = self._get_queue()
+        while True:
+            key = await queue.get()
+            job = self._pending.pop(key, None)
+            if job is None:
+                continue
+            self.current = job
+            try:
+                await self.prebuild(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.cache.put(dict(job, status="failed", error=str(e), finished_at=time.time()))
+            finally:
+                self.current = None
+
+    async def _wait_for_idle(self):
+        """Defer while interactive builds are running, up to PREBUILD_MAX_DEFER seconds"""
+        scheduler = get_build_scheduler()
+        deadline = time.monotonic() + PREBUILD_MAX_DEFER
+        while any(host.active_builds for host in scheduler.hosts) and time.monotonic() < deadline:
+            await asyncio.sleep(PREBUILD_IDLE_POLL)
+
+    async def prebuild(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Clone the pushed branch, analyze it and build its image without running it"""
+        from awsbedrock import get_bedrock_agent, build_and_run_docker
+        from s2i_builder import containerize_with_s2i
+        from build_context import prune_build_context
+
+        entry = dict(job, status="running", started_at=time.time())
+        self.cache.put(entry)
+        workspace = os.path.abspath(os.path.join(PREBUILD_DIR, f"{_slug(job['repo_url'])}-{job['commit'][:12]}"))
+
+        with get_reclaimer().in_use(workspaces=[workspace]):
+            try:
+                if os.path.exists(workspace):
+                    await asyncio.to_thread(shutil.rmtree, workspace)
+                await self._wait_for_idle()
+
+                clone_cmd = ["git", "clone", "--depth", "1", "--single-branch", "--branch", job["branch"],
+                             job["repo_url"], workspace]
+                store = get_log_store()
+                clone_log_id = store.start_command_log("prebuild-clone", clone_cmd)
+                try:
+                    result = await run_command(clone_cmd, timeout=GIT_TIMEOUT, group="git",
+                                               on_output=store.writer(clone_log_id))
+                finally:
+                    await asyncio.to_thread(store.finalize, clone_log_id)
+                entry["clone_log_id"] = clone_log_id
+                if not result.ok:
+                    entry.update(status="failed", error=f"Clone failed: {tail_text(result.stderr)}", finished_at=time.time())
+                    self.cache.put(entry)
+                    return entry
+
+                # The branch may have moved on since the push; cache what was actually built
+                head = await workspace_commit(workspace)
+                if head and head != job["commit"]:
+                    self.cache.put(dict(entry, status="superseded", finished_at=time.time(), built_commit=head))
+                    entry.update(commit=head, requested_commit=job["commit"])
+
+                # Analysis
+                project_type = None
+                try:
+                    agent = await asyncio.to_thread(get_bedrock_agent)
+                    session = await asyncio.to_thread(agent.workspace_session, workspace)
+                    analysis, _ = await asyncio.to_thread(
+                        agent.analyze_repository, repo_key(job["repo_url"]).split("/")[-1], session
+                    )
+                    entry["analysis"] = analysis.model_dump()
+                    project_type = analysis.project_type
+                except Exception as e:
+                    entry["analysis_error"] = str(e)
+
+                # Image
+                await asyncio.to_thread(prune_build_context, workspace, project_type)
+                await self._wait_for_idle()
+                image_name = f"prebuild-{_slug(job['repo_url'])}:{entry['commit'][:12]}"
+                if os.path.exists(os.path.join(workspace, "Dockerfile")):
+                    builder = "docker"
+                    build = await build_and_run_docker(workspace, image_name, run_container=False)
+                else:
+                    builder = "s2i"
+                    build = await containerize_with_s2i(workspace, None, image_name, run_container=False)
+                if build.get("success"):
+                    entry["image"] = {
+                        "name": image_name,
+                        "builder": builder,
+                        "docker_host": build.get("docker_host"),
+                        "build_duration": build.get("build_duration"),
+                        "log_id": build.get("build_log_id") or build.get("log_id")
+                    }
+                else:
+                    entry["image_error"] = build.get("error", "Image build failed")
+
+                ready = "analysis" in entry or "image" in entry
+                entry.update(status="ready" if ready else "failed", finished_at=time.time())
+                self.cache.put(entry)
+                return entry
+            finally:
+                # The image and analysis are what is kept; the checkout is not needed anymore
+                if os.path.exists(workspace):
+                    await asyncio.to_thread(shutil.rmtree, workspace, True)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "current": self.current,
+            "pending": list(self._pending.values())
+        }
+
+async def run_prebuilt_image(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Start a container from a prebuilt image on the host that built it"""
+    image = entry["image"]
+    scheduler = get_build_scheduler()
+    host = next((host for host in scheduler.hosts if host.name == (image.get("docker_host") or "default")), None)
+    if host is None:
+        return {"error": f"Build host '{image.get('docker_host')}' is no longer configured"}
+
+    run_cmd = host.docker("run", "-d", "--label", MANAGED_LABEL, *container_run_args(), "-p", "8080:8080", image["name"])
+    try:
+        result = await run_command(run_cmd, timeout=DOCKER_CLI_TIMEOUT, group="docker", env=host.env)
+    except FileNotFoundError:
+        return {"error": "Docker not installed"}
+    if not result.ok:
+        return {"error": f"Docker run failed: {result.stderr.strip()}"}
+
+    container_id = result.stdout.strip()
+    get_reclaimer().track_container(container_id, image["name"], host.docker_host)
+    return {
+        "success": True,
+        "prebuilt": True,
+        "image": image["name"],
+        "commit": entry["commit"],
+        "container_id": container_id,
+        "docker_host": host.name,
+        "message": "Started prebuilt image. Container running on port 8080"
+    }
+
+_cache = None
+_queue = None
+
+def get_prebuild_cache() -> PrebuildCache:
+    """Return the process-wide prebuild cache"""
+    global _cache
+    if _cache is None:
+        _cache = PrebuildCache()
+    return _cache
+
+def get_prebuild_queue() -> PrebuildQueue:
+    """Return the process-wide prebuild queue"""
+    global _queue
+    if _queue is None:
+        _queue = PrebuildQueue()
+    return _queue
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from command_runner import run_command
+from build_scheduler import get_build_scheduler
+
+# Builder images pulled in the background at startup so the first S2I build
+# does not pay for the download. Override with a comma separated list, or set
+# PREWARM_BUILDER_IMAGES="" to skip pulling.
+DEFAULT_BUILDER_IMAGES = [
+    "registry.redhat.io/ubi9/python-311",
+    "registry.redhat.io/ubi9/nodejs-18"
+]
+IMAGE_PULL_TIMEOUT = int(os.getenv("PREWARM_PULL_TIMEOUT", "600"))
+
+_state_lock = threading.Lock()
+_state: Dict[str, Any] = {
+    "status": "pending",
+    "steps": {},
+    "started_at": None,
+    "finished_at": None
+}
+
+def prewarm_enabled() -> bool:
+    """Pre-warming runs unless PREWARM is set to 0/false/no"""
+    return os.getenv("PREWARM", "1").lower() not in ("0", "false", "no")
+
+def get_builder_images() -> List[str]:
+    """Builder images to pre-pull, from PREWARM_BUILDER_IMAGES or the defaults"""
+    configured = os.getenv("PREWARM_BUILDER_IMAGES")
+    if configured is None:
+        return list(DEFAULT_BUILDER_IMAGES)
+    return [image.strip() for image in configured.split(",") if image.strip()]
+
+def get_warmup_state() -> Dict[str, Any]:
+    """Return a snapshot of the warm-up progress for /health"""
+    with _state_lock:
+        snapshot = dict(_state)
+        snapshot["steps"] = {name: dict(step) for name, step in _state["steps"].items()}
+    # Ready only once every step succeeded; failed steps are listed so the cause is visible
+    snapshot["failed_steps"] = sorted(name for name, step in snapshot["steps"].items() if not step["ok"])
+    snapshot["ready"] = snapshot["status"] == "disabled" or (
+        snapshot["status"] == "ready" and not snapshot["failed_steps"]
+    )
+    return snapshot
+
+def _record_step(name: str, started: float, ok: bool, detail: Any = None):
+    step = {"ok": ok, "duration": round(time.monotonic() - started, 3)}
+    if detail is not None:
+        step["detail"] = detail
+    with _state_lock:
+        _state["steps"][name] = step
+
+async def _warm_bedrock_client():
+    started = time.monotonic()
+    try:
+        # Importing awsbedrock/boto3 and creating the client are blocking, keep them off the loop
+        def create_agent():
+            from awsbedrock import get_bedrock_agent
+            return get_bedrock_agent()
+        agent = await asyncio.to_thread(create_agent)
+        _record_step("bedrock_client", started, True, agent.model_id)
+    except Exception as e:
+        _record_step("bedrock_client", started, False, str(e))
+
+async def _warm_s2i_probe():
+    from s2i_setup import check_s2i_installation
+    started = time.monotonic()
+    result = await check_s2i_installation()
+    _record_step("s2i", started, bool(result.get("installed")), result.get("version") or result.get("error"))
+
+async def _warm_docker_probe() -> bool:
+    from awsbedrock import check_docker_daemon
+    started = time.monotonic()
+    scheduler = get_build_scheduler()
+    if scheduler.local_only:
+        result = await check_docker_daemon(refresh=True)
+    else:
+        healthy = await scheduler.any_healthy()
+        result = {"message": "Docker endpoint reachable"} if healthy else {"error": "No healthy docker endpoint"}
+        result["running"] = healthy
+    running = bool(result.get("running"))
+    _record_step("docker", started, running, result.get("message") or result.get("error"))
+    return running
+
+async def _pull_builder_images():
+    # Every healthy build host gets the images, since builds may land on any of them
+    scheduler = get_build_scheduler()
+    hosts = [host for host in scheduler.hosts if host.healthy is not False]
+    for image in get_builder_images():
+        for host in hosts:
+            step = f"pull:{image}" if scheduler.local_only else f"pull:{image}@{host.name}"
+            started = time.monotonic()
+            try:
+                result = await run_command(host.docker("pull", image), timeout=IMAGE_PULL_TIMEOUT,
+                                           group="docker", env=host.env)
+                if result.timed_out:
+                    _record_step(step, started, False, "Image pull timed out")
+                else:
+                    _record_step(step, started, result.ok, None if result.ok else result.stderr.strip()[-500:])
+                if result.ok:
+                    host.cached_images.add(image)
+            except Exception as e:
+                _record_step(step, started, False, str(e))
+
+async def prewarm() -> Dict[str, Any]:
+    """Build clients, probe the toolchain and pre-pull builder images"""
+    with _state_lock:
+        _state["status"] = "warming"
+        _state["started_at"] = time.time()
+
+    _, _, docker_running = await asyncio.gather(
+        _warm_bedrock_client(),
+        _warm_s2i_probe(),
+        _warm_docker_probe()
+    )
+    if docker_running:
+        await _pull_builder_images()
+
+    with _state_lock:
+        failed = any(not step["ok"] for step in _state["steps"].values())
+        # Docker down also skips the image pulls, which the failed docker step reports
+        _state["status"] = "degraded" if failed else "ready"
+        _state["finished_at"] = time.time()
+    return get_warmup_state()
+
+def start_prewarm() -> Optional[asyncio.Task]:
+    """Schedule prewarm() as a background task so startup never waits on it"""
+    if not prewarm_enabled():
+        with _state_lock:
+            _state["status"] = "disabled"
+        return None
+    return asyncio.get_running_loop().create_task(prewarm())
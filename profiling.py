@@ -0,0 +1,159 @@
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_HEADER = "x-profile"
+# Fraction of requests profiled without the header, e.g. 0.01 for 1%
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+MAX_CONCURRENT_PROFILES = 2
+
+_PROFILE_ID_PATTERN = re.compile(r"^[a-f0-9]{32}$")
+_active_profiles = threading.BoundedSemaphore(MAX_CONCURRENT_PROFILES)
+_spans: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar("profiling_spans", default=None)
+
+class SamplingProfiler:
+    """Statistical profiler that periodically samples the stacks of all threads.
+
+    Samples are aggregated as folded stacks ("outer;inner;leaf" -> count),
+    which flamegraph.pl and speedscope read directly. Stacks of requests
+    running concurrently with the profiled one are included as well.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+def should_profile(headers) -> bool:
+    """Profile when the request asks for it or falls in the sampled fraction"""
+    if headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def begin_spans() -> List[Dict[str, Any]]:
+    """Start collecting stage spans for the current request"""
+    spans = []
+    _spans.set(spans)
+    return spans
+
+@contextmanager
+def span(name: str):
+    """Record the wall-clock duration of a pipeline stage in the current request"""
+    spans = _spans.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if spans is not None:
+            spans.append({"name": name, "start": started, "duration": time.perf_counter() - started})
+
+def server_timing_header(spans: List[Dict[str, Any]]) -> str:
+    """Format spans as a Server-Timing header value"""
+    return ", ".join(
+        f"{re.sub(r'[^A-Za-z0-9_-]', '_', item['name'])};dur={item['duration'] * 1000:.1f}"
+        for item in spans
+    )
+
+def start_profile() -> Optional[SamplingProfiler]:
+    """Start a sampler unless MAX_CONCURRENT_PROFILES are already running"""
+    if not _active_profiles.acquire(blocking=False):
+        return None
+    profiler = SamplingProfiler()
+    profiler.start()
+    return profiler
+
+def finish_profile(profiler: SamplingProfiler, request_info: Dict[str, Any],
+                   spans: List[Dict[str, Any]], started: float) -> str:
+    """Stop the sampler, store the profile and return its id"""
+    try:
+        profiler.stop()
+    finally:
+        _active_profiles.release()
+
+    profile_id = uuid.uuid4().hex
+    profile = dict(request_info)
+    profile.update({
+        "profile_id": profile_id,
+        "created_at": time.time(),
+        "duration": round(time.perf_counter() - started, 6),
+        "interval": profiler.interval,
+        "sample_count": profiler.sample_count,
+        "spans": [
+            {
+                "name": item["name"],
+                "offset": round(item["start"] - started, 6),
+                "duration": round(item["duration"], 6)
+            }
+            for item in spans
+        ],
+        "folded_stacks": dict(profiler.samples.most_common())
+    })
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "w") as f:
+        json.dump(profile, f)
+    _prune_profiles()
+    return profile_id
+
+def _prune_profiles():
+    files = [os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith(".json")]
+    if len(files) <= PROFILE_KEEP:
+        return
+    files.sort(key=os.path.getmtime)
+    for path in files[:-PROFILE_KEEP]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def load_profile(profile_id: str) -> Dict[str, Any]:
+    """Load a stored profile; raises ValueError for bad ids, FileNotFoundError if missing"""
+    if not _PROFILE_ID_PATTERN.match(profile_id or ""):
+        raise ValueError(f"Invalid profile id '{profile_id}'")
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json")) as f:
+        return json.load(f)
+
+def folded_text(profile: Dict[str, Any]) -> str:
+    """Render a profile's samples in folded-stack text format"""
+    return "\n".join(f"{stack} {count}" for stack, count in profile["folded_stacks"].items())
@@ -0,0 +1,30 @@
+import os
+from typing import Optional
+
+# Small helpers about a checked-out project, shared by the Bedrock agent, the
+# S2I builder and monorepo discovery. Kept free of heavy imports.
+
+# Skip hidden directories and common build directories
+def skip_dir(name: str) -> bool:
+    return name.startswith('.') or name in ['node_modules', '__pycache__', 'venv']
+
+def dockerfile_base_image(dockerfile_path: str) -> Optional[str]:
+    """Image named by the last FROM line, used for build host affinity"""
+    base_image = None
+    try:
+        with open(dockerfile_path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].upper() == "FROM":
+                    base_image = next((part for part in parts[1:] if not part.startswith("--")), None)
+    except OSError:
+        pass
+    return base_image
+
+def detect_builder_image(source_path: str) -> Optional[str]:
+    """S2I builder image for the manifests at the top of source_path, if recognised"""
+    if os.path.exists(os.path.join(source_path, "requirements.txt")):
+        return "registry.redhat.io/ubi9/python-311"
+    if os.path.exists(os.path.join(source_path, "package.json")):
+        return "registry.redhat.io/ubi9/nodejs-18"
+    return None
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, List, Iterable
+from command_runner import run_command, DOCKER_CLI_TIMEOUT
+from build_scheduler import DOCKER_BIN, configured_endpoints, docker_env
+from log_store import get_log_store, LOG_MAX_AGE, LOG_KEEP
+
+SERVICE_STATE_DIR = os.getenv("SERVICE_STATE_DIR", "service_state")
+# Label put on images and containers this service creates
+MANAGED_LABEL = "agentic-ai.managed=true"
+
+RECLAIM_INTERVAL = int(os.getenv("RECLAIM_INTERVAL", "900"))
+WORKSPACE_QUOTA_BYTES = int(os.getenv("WORKSPACE_QUOTA_BYTES", str(5 * 1024 ** 3)))
+WORKSPACE_MAX_AGE = int(os.getenv("WORKSPACE_MAX_AGE", str(7 * 24 * 3600)))
+IMAGE_QUOTA_BYTES = int(os.getenv("IMAGE_QUOTA_BYTES", str(20 * 1024 ** 3)))
+IMAGE_MAX_AGE = int(os.getenv("IMAGE_MAX_AGE", str(7 * 24 * 3600)))
+CONTAINER_MAX_AGE = int(os.getenv("CONTAINER_MAX_AGE", "3600"))
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def _remove_tree(path: str):
+    def make_writable(func, target, _):
+        # git pack files are read-only on Windows
+        os.chmod(target, 0o700)
+        func(target)
+    shutil.rmtree(path, onerror=make_writable)
+
+class Reclaimer:
+    """Disk-quota driven garbage collector for workspaces, images, containers and logs.
+
+    Resources are recorded in a small JSON ledger when jobs create them.
+    reclaim() removes expired or least recently used workspaces beyond the
+    quota, dangling or expired images, stopped containers, and finalized
+    clone and build logs past LOG_MAX_AGE/LOG_KEEP. Anything marked with
+    in_use() by a running job is skipped.
+    """
+
+    def __init__(self, state_dir: str = SERVICE_STATE_DIR):
+        self.ledger_path = os.path.join(state_dir, "resources.json")
+        os.makedirs(state_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._busy: Dict[str, int] = {}
+        self._ledger = self._load()
+        self.stats = {
+            "runs": 0,
+            "reclaimed_bytes": 0,
+            "reclaimed": {"workspaces": 0, "images": 0, "containers": 0, "logs": 0},
+            "last_run": None
+        }
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.ledger_path) as f:
+                ledger = json.load(f)
+        except (OSError, ValueError):
+            ledger = {}
+        for kind in ("workspaces", "images", "containers"):
+            ledger.setdefault(kind, {})
+        return ledger
+
+    def _save(self):
+        tmp_path = self.ledger_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._ledger, f, indent=2)
+        os.replace(tmp_path, self.ledger_path)
+
+    def _touch(self, kind: str, key: str, **details):
+        now = time.time()
+        with self._lock:
+            entry = self._ledger[kind].setdefault(key, {"created_at": now})
+            entry["last_used"] = now
+            entry.update(details)
+            self._save()
+
+    def _forget(self, kind: str, key: str):
+        with self._lock:
+            if self._ledger[kind].pop(key, None) is not None:
+                self._save()
+
+    def track_workspace(self, path: str):
+        """Record that a job created or used a workspace directory"""
+        self._touch("workspaces", os.path.abspath(path))
+
+    async def track_image(self, image: str, docker_host: str = None):
+        """Record an image built by this service by its id, so it is still known once untagged"""
+        lines = await self._docker_lines(["image", "inspect", "--format", "{{.Id}}", image], docker_host)
+        if lines:
+            self._touch("images", lines[0], tag=image, docker_host=docker_host)
+
+    def track_container(self, container_id: str, image: str = None, docker_host: str = None):
+        """Record a container started by this service"""
+        self._touch("containers", container_id, image=image, docker_host=docker_host)
+
+    @contextmanager
+    def in_use(self, workspaces: Iterable[str] = (), images: Iterable[str] = (), containers: Iterable[str] = ()):
+        """Protect resources from reclamation while a job is using them"""
+        keys = (
+            [f"workspace:{os.path.abspath(path)}" for path in workspaces if path]
+            + [f"image:{image}" for image in images if image]
+            + [f"container:{container}" for container in containers if container]
+        )
+        with self._lock:
+            for key in keys:
+                self._busy[key] = self._busy.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                for key in keys:
+                    self._busy[key] -= 1
+                    if not self._busy[key]:
+                        del self._busy[key]
+            for path in workspaces:
+                if path and os.path.exists(path):
+                    self.track_workspace(path)
+
+    def _is_busy(self, key: str) -> bool:
+        with self._lock:
+            return key in self._busy
+
+    async def _reclaim_workspaces(self, dry_run: bool) -> List[Dict[str, Any]]:
+        now = time.time()
+        workspaces = []
+        for path, entry in list(self._ledger["workspaces"].items()):
+            if not os.path.exists(path):
+                self._forget("workspaces", path)
+                continue
+            size = await asyncio.to_thread(_dir_size, path)
+            workspaces.append((entry.get("last_used", 0), path, size))
+
+        total = sum(size for _, _, size in workspaces)
+        removed = []
+        # Least recently used first
+        for last_used, path, size in sorted(workspaces):
+            expired = now - last_used > WORKSPACE_MAX_AGE
+            if not expired and total <= WORKSPACE_QUOTA_BYTES:
+                continue
+            if self._is_busy(f"workspace:{path}"):
+                continue
+            reason = "expired" if expired else "quota"
+            if not dry_run:
+                # Rename first so no new job can pick the directory up while it is deleted
+                doomed = f"{path}.reclaim-{uuid.uuid4().hex[:8]}"
+                try:
+                    os.rename(path, doomed)
+                except OSError:
+                    continue
+                await asyncio.to_thread(_remove_tree, doomed)
+                self._forget("workspaces", path)
+            total -= size
+            removed.append({"path": path, "bytes": size, "reason": reason})
+        return removed
+
+    async def _docker_lines(self, args: List[str], docker_host: str = None) -> List[str]:
+        try:
+            result = await run_command([DOCKER_BIN] + args, timeout=DOCKER_CLI_TIMEOUT, group="docker",
+                                       env=docker_env(docker_host))
+        except FileNotFoundError:
+            return []
+        if not result.ok:
+            return []
+        return [line.strip() for line in result.stdout.splitlines() if line.strip()]
+
+    async def _image_info(self, image_id: str, docker_host: str = None) -> Dict[str, Any]:
+        lines = await self._docker_lines(
+            ["image", "inspect", "--format", "{{.Size}} {{len .RepoTags}}", image_id], docker_host
+        )
+        if not lines:
+            return None
+        size, tag_count = lines[0].split()
+        return {"size": int(size), "dangling": tag_count == "0"}
+
+    def _ledger_entries(self, kind: str, docker_host: str = None) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                key: dict(entry) for key, entry in self._ledger[kind].items()
+                if entry.get("docker_host") == docker_host
+            }
+
+    async def _reclaim_containers(self, dry_run: bool, docker_host: str = None) -> List[Dict[str, Any]]:
+        now = time.time()
+        stopped = set(await self._docker_lines(
+            ["ps", "-a", "--no-trunc", "--filter", f"label={MANAGED_LABEL}",
+             "--filter", "status=exited", "--filter", "status=created", "--filter", "status=dead",
+             "--format", "{{.ID}}"],
+            docker_host
+        ))
+        for container_id in self._ledger_entries("containers", docker_host):
+            state = await self._docker_lines(
+                ["container", "inspect", "--format", "{{.State.Status}}", container_id], docker_host
+            )
+            if not state:
+                self._forget("containers", container_id)
+            elif state[0] in ("exited", "created", "dead"):
+                stopped.add(container_id)
+
+        removed = []
+        for container_id in sorted(stopped):
+            entry = self._ledger["containers"].get(container_id, {})
+            if now - entry.get("created_at", 0) < CONTAINER_MAX_AGE:
+                continue
+            if self._is_busy(f"container:{container_id}"):
+                continue
+            size_lines = await self._docker_lines(
+                ["container", "inspect", "--size", "--format", "{{.SizeRw}}", container_id], docker_host
+            )
+            size = int(size_lines[0]) if size_lines and size_lines[0].isdigit() else 0
+            if not dry_run:
+                if not await self._docker_lines(["rm", container_id], docker_host):
+                    continue
+                self._forget("containers", container_id)
+            removed.append({"container_id": container_id, "docker_host": docker_host, "bytes": size, "reason": "stopped"})
+        return removed
+
+    async def _reclaim_images(self, dry_run: bool, docker_host: str = None) -> List[Dict[str, Any]]:
+        now = time.time()
+        candidates = {}
+        for image_id in await self._docker_lines(
+            ["images", "-q", "--no-trunc", "--filter", "dangling=true", "--filter", f"label={MANAGED_LABEL}"],
+            docker_host
+        ):
+            candidates[image_id] = {"created_at": 0, "last_used": 0}
+        candidates.update(self._ledger_entries("images", docker_host))
+
+        images = []
+        for image_id, entry in candidates.items():
+            info = await self._image_info(image_id, docker_host)
+            if info is None:
+                self._forget("images", image_id)
+                continue
+            images.append((entry.get("last_used", 0), image_id, entry.get("tag"), info))
+
+        total = sum(info["size"] for *_, info in images)
+        removed = []
+        for last_used, image_id, tag, info in sorted(images, key=lambda item: item[0]):
+            expired = now - last_used > IMAGE_MAX_AGE
+            if info["dangling"]:
+                reason = "dangling"
+            elif expired:
+                reason = "expired"
+            elif total > IMAGE_QUOTA_BYTES:
+                reason = "quota"
+            else:
+                continue
+            if self._is_busy(f"image:{image_id}") or (tag and self._is_busy(f"image:{tag}")):
+                continue
+            if not dry_run:
+                # Without --force docker refuses to remove images that containers still use
+                target = image_id if info["dangling"] or not tag else tag
+                if not await self._docker_lines(["rmi", target], docker_host):
+                    continue
+                self._forget("images", image_id)
+            total -= info["size"]
+            removed.append({
+                "image_id": image_id, "tag": tag, "docker_host": docker_host,
+                "bytes": info["size"], "reason": reason
+            })
+        return removed
+
+    async def reclaim(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Run one reclamation pass and return what was (or would be) removed"""
+        started = time.monotonic()
+        report = {"dry_run": dry_run, "workspaces": await self._reclaim_workspaces(dry_run)}
+        report["containers"] = []
+        report["images"] = []
+        report["unreachable_docker_hosts"] = []
+        for docker_host in configured_endpoints():
+            # Skip a daemon that is unreachable, so its ledger entries are kept
+            if not await self._docker_lines(["version", "--format", "{{.Server.Version}}"], docker_host):
+                report["unreachable_docker_hosts"].append(docker_host or "default")
+                continue
+            # Containers go first so the images they held can be removed in the same pass
+            report["containers"] += await self._reclaim_containers(dry_run, docker_host)
+            report["images"] += await self._reclaim_images(dry_run, docker_host)
+        report["logs"] = await asyncio.to_thread(get_log_store().prune, dry_run=dry_run)
+        report["reclaimed_bytes"] = sum(
+            item["bytes"] for kind in ("workspaces", "containers", "images", "logs") for item in report[kind]
+        )
+        report["duration"] = round(time.monotonic() - started, 3)
+        report["finished_at"] = time.time()
+
+        if not dry_run:
+            self.stats["runs"] += 1
+            self.stats["reclaimed_bytes"] += report["reclaimed_bytes"]
+            for kind in ("workspaces", "images", "containers", "logs"):
+                self.stats["reclaimed"][kind] += len(report[kind])
+            self.stats["last_run"] = report
+        return report
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Totals since startup plus the current ledger and quotas"""
+        with self._lock:
+            tracked = {kind: len(entries) for kind, entries in self._ledger.items()}
+            busy = sorted(self._busy)
+        return dict(
+            self.stats,
+            tracked=tracked,
+            in_use=busy,
+            quotas={
+                "workspace_bytes": WORKSPACE_QUOTA_BYTES,
+                "workspace_max_age": WORKSPACE_MAX_AGE,
+                "image_bytes": IMAGE_QUOTA_BYTES,
+                "image_max_age": IMAGE_MAX_AGE,
+                "container_max_age": CONTAINER_MAX_AGE,
+                "log_max_age": LOG_MAX_AGE,
+                "log_keep": LOG_KEEP
+            }
+        )
+
+    async def run_periodically(self, interval: int = RECLAIM_INTERVAL):
+        """Background loop started from the app lifespan"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reclaim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["last_error"] = str(e)
+
+_reclaimer = None
+
+def get_reclaimer() -> Reclaimer:
+    """Return the process-wide reclaimer"""
+    global _reclaimer
+    if _reclaimer is None:
+        _reclaimer = Reclaimer()
+    return _reclaimer
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from typing import Dict, Any, List
+from command_runner import run_command, CommandResult, GIT_TIMEOUT
+
+# Files the analyzer reads to detect the project type and dependencies
+MANIFEST_FILES = (
+    "requirements.txt", "pyproject.toml", "setup.py", "Pipfile",
+    "package.json", "pom.xml", "build.gradle", "go.mod",
+    "Gemfile", "composer.json", "Cargo.toml", "Dockerfile"
+)
+MANIFEST_MAX_DEPTH = 2
+MANIFEST_MAX_FILES = 20
+MANIFEST_MAX_BYTES = 64 * 1024
+
+async def _git(args: List[str], cwd: str = None, timeout: int = 120) -> CommandResult:
+    return await run_command(["git"] + args, timeout=timeout, group="git", cwd=cwd)
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def select_manifest_paths(paths: List[str]) -> List[str]:
+    """Pick the manifest files worth fetching from a tree listing"""
+    selected = [
+        path for path in paths
+        if os.path.basename(path) in MANIFEST_FILES and path.count("/") <= MANIFEST_MAX_DEPTH
+    ]
+    # Shallowest first so the root manifests always make the cut
+    selected.sort(key=lambda path: (path.count("/"), path))
+    return selected[:MANIFEST_MAX_FILES]
+
+async def fetch_repo_tree(repo_url: str, timeout: int = GIT_TIMEOUT) -> Dict[str, Any]:
+    """Acquire a repository for analysis only, without downloading its contents.
+
+    Uses a shallow blobless partial clone with no checkout, lists paths with
+    ``git ls-tree`` and fetches only the blobs of manifest files.
+    """
+    clone_dir = tempfile.mkdtemp(prefix="repo-tree-")
+    try:
+        result = await _git(
+            ["clone", "--filter=blob:none", "--no-checkout", "--depth", "1",
+             "--single-branch", repo_url, clone_dir],
+            timeout=timeout
+        )
+        if result.timed_out:
+            return {"error": "Partial clone timed out"}
+        if not result.ok:
+            return {"error": f"Partial clone failed: {result.stderr.strip()}"}
+
+        commit = (await _git(["rev-parse", "HEAD"], cwd=clone_dir)).stdout.strip()
+
+        # Trees are present in a blobless clone, so this needs no extra transfer
+        listing = await _git(["ls-tree", "-r", "-z", "HEAD"], cwd=clone_dir, timeout=timeout)
+        if not listing.ok:
+            return {"error": f"git ls-tree failed: {listing.stderr.strip()}"}
+
+        blobs = {}
+        for entry in listing.stdout.split("\0"):
+            if not entry:
+                continue
+            meta, path = entry.split("\t", 1)
+            _, object_type, oid = meta.split()
+            if object_type == "blob":
+                blobs[path] = oid
+
+        paths = sorted(blobs)
+        selected = select_manifest_paths(paths)
+        if selected:
+            # One fetch for all manifest blobs. Reading them one by one would
+            # make git fetch each missing blob from the promisor remote separately.
+            await _git(
+                ["-c", "fetch.negotiationAlgorithm=noop", "fetch", "--no-tags", "--no-write-fetch-head",
+                 "--recurse-submodules=no", "--filter=blob:none", "origin"] + [blobs[path] for path in selected],
+                cwd=clone_dir, timeout=timeout
+            )
+        manifests = {}
+        for path in selected:
+            # Local once fetched; a blob the batch fetch missed is still fetched lazily
+            blob = await _git(["cat-file", "blob", blobs[path]], cwd=clone_dir, timeout=timeout)
+            if blob.ok:
+                manifests[path] = blob.stdout[:MANIFEST_MAX_BYTES]
+
+        return {
+            "success": True,
+            "commit": commit,
+            "paths": paths,
+            "manifests": manifests,
+            "transfer_bytes": await asyncio.to_thread(_dir_size, os.path.join(clone_dir, ".git", "objects"))
+        }
+    except Exception as e:
+        return {"error": f"Partial clone failed: {str(e)}"}
+    finally:
+        await asyncio.to_thread(shutil.rmtree, clone_dir, True)
@@ -0,0 +1,76 @@
+import os
+import re
+from typing import List, Optional
+
+_SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+def parse_size(value: str) -> int:
+    """Bytes of a docker style size such as "512m" or "2g"; 0 for empty or "0" """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([bkmgt]?)b?\s*", (value or "0").lower())
+    if not match:
+        raise ValueError(f"Invalid size '{value}'")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+# Limits per build and per preview container; 0 disables a limit
+BUILD_CPUS = float(os.getenv("BUILD_CPUS", "2"))
+BUILD_MEMORY = parse_size(os.getenv("BUILD_MEMORY", "4g"))
+BUILD_PIDS = int(os.getenv("BUILD_PIDS", "2048"))
+CONTAINER_CPUS = float(os.getenv("CONTAINER_CPUS", "1"))
+CONTAINER_MEMORY = parse_size(os.getenv("CONTAINER_MEMORY", "1g"))
+CONTAINER_PIDS = int(os.getenv("CONTAINER_PIDS", "512"))
+# Capacity of each docker host kept out of build admission, for the API
+# process, preview containers and the daemon itself
+HOST_RESERVED_CPUS = float(os.getenv("HOST_RESERVED_CPUS", "1"))
+HOST_RESERVED_MEMORY = parse_size(os.getenv("HOST_RESERVED_MEMORY", "1g"))
+
+_CPU_PERIOD = 100000
+
+def container_run_args() -> List[str]:
+    """docker run flags limiting a preview container"""
+    args = []
+    if CONTAINER_CPUS:
+        args += ["--cpus", f"{CONTAINER_CPUS:g}"]
+    if CONTAINER_MEMORY:
+        # Equal memory-swap keeps the container from swapping past its limit
+        args += ["--memory", str(CONTAINER_MEMORY), "--memory-swap", str(CONTAINER_MEMORY)]
+    if CONTAINER_PIDS:
+        args += ["--pids-limit", str(CONTAINER_PIDS)]
+    return args
+
+def legacy_build_args() -> List[str]:
+    """Per-build cgroup flags of the classic `docker build`.
+
+    BuildKit ignores these; its builds are limited through the builder
+    container instead (see builder_driver_opts).
+    """
+    args = []
+    if BUILD_CPUS:
+        args += ["--cpu-period", str(_CPU_PERIOD), "--cpu-quota", str(int(BUILD_CPUS * _CPU_PERIOD))]
+    if BUILD_MEMORY:
+        args += ["--memory", str(BUILD_MEMORY), "--memory-swap", str(BUILD_MEMORY)]
+    return args
+
+def builder_driver_opts(builds_per_host: int) -> List[str]:
+    """buildx docker-container driver options capping all builds on one host.
+
+    The builder container runs every BuildKit build of its host, so it gets
+    the per-build limits times the builds the scheduler admits at once.
+    """
+    opts = []
+    if BUILD_CPUS:
+        opts += [f"cpu-period={_CPU_PERIOD}", f"cpu-quota={int(BUILD_CPUS * builds_per_host * _CPU_PERIOD)}"]
+    if BUILD_MEMORY:
+        memory = BUILD_MEMORY * builds_per_host
+        opts += [f"memory={memory}", f"memory-swap={memory}"]
+    return [arg for opt in opts for arg in ("--driver-opt", opt)]
+
+def available_memory() -> Optional[int]:
+    """MemAvailable of this machine, or None where /proc/meminfo does not exist"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
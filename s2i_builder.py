@@ -1,43 +1,72 @@
+import asyncio
 import os
-import subprocess
-import json
 from typing import Dict, Any
+from command_runner import run_command, BUILD_TIMEOUT, DOCKER_CLI_TIMEOUT
+from log_store import get_log_store, tail_text
+from profiling import span
+from reclaimer import get_reclaimer, MANAGED_LABEL
+from build_scheduler import get_build_scheduler, is_host_failure
+from build_context import prune_build_context
+from resource_limits import container_run_args
+from project_layout import detect_builder_image
 
 class S2IBuilder:
-    def __init__(self):
-        """Initialize S2I Builder"""
-        self.s2i_available = self._check_s2i_availability()
+    def __init__(self, s2i_command: str = None):
+        """Initialize S2I Builder; availability is detected on first build"""
+        self.s2i_command = s2i_command
+        self.s2i_available = True if s2i_command else None
     
-    def _check_s2i_availability(self) -> bool:
+    async def _check_s2i_availability(self) -> bool:
         """Check if S2I is installed with enhanced detection"""
         from s2i_setup import check_s2i_installation
-        result = check_s2i_installation()
+        result = await check_s2i_installation()
         if result.get("installed"):
             self.s2i_command = result.get("path", "s2i")
             return True
         return False
     
-    def build_with_s2i(self, source_dir: str, builder_image: str, output_image: str) -> Dict[str, Any]:
-        """Build container image using S2I"""
+    async def build_with_s2i(self, source_dir: str, builder_image: str, output_image: str,
+                             env: Dict[str, str] = None, group: str = "build") -> Dict[str, Any]:
+        """Build container image using S2I; env can point DOCKER_HOST at a build host.
+
+        group is the command runner group limiting concurrent builds, one per
+        docker host for scheduled builds.
+        """
+        if self.s2i_available is None:
+            self.s2i_available = await self._check_s2i_availability()
         if not self.s2i_available:
             return {"error": "S2I is not installed. Install from: https://github.com/openshift/source-to-image"}
         
         try:
-            # Use the detected S2I command path
-            cmd = [getattr(self, 's2i_command', 's2i'), 'build', source_dir, builder_image, output_image]
+            # Use the detected S2I command path. --copy makes s2i take the working
+            # tree as is; a git clone of it would miss the generated .s2iignore.
+            cmd = [self.s2i_command or 's2i', 'build', '--copy', source_dir, builder_image, output_image]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # Output streams to the log store; responses carry a tail and the log id
+            store = get_log_store()
+            log_id = store.start_command_log("s2i-build", cmd)
+            try:
+                with span("s2i_build"):
+                    result = await run_command(cmd, timeout=BUILD_TIMEOUT, group=group, env=env, on_output=store.writer(log_id))
+            finally:
+                await asyncio.to_thread(store.finalize, log_id)
             
-            if result.returncode == 0:
+            if result.ok:
                 return {
                     "success": True,
                     "image": output_image,
-                    "output": result.stdout
+                    "log_id": log_id,
+                    "output_tail": tail_text(result.stdout),
+                    "build_duration": round(result.duration, 3)
                 }
             else:
                 return {
-                    "error": f"S2I build failed: {result.stderr}",
-                    "output": result.stdout
+                    "error": f"S2I build failed: {tail_text(result.stderr)}",
+                    "log_id": log_id,
+                    "output_tail": tail_text(result.stdout),
+                    "build_duration": round(result.duration, 3),
+                    "timed_out": result.timed_out,
+                    "host_failure": is_host_failure(result)
                 }
         except Exception as e:
             return {"error": f"S2I build error: {str(e)}"}
@@ -61,26 +90,65 @@ class S2IBuilder:
         }
         return builders.get(project_type, {})
 
-def containerize_with_s2i(source_path: str = "cloned_repos", builder_image: str = None, output_image: str = "my-app") -> Dict[str, Any]:
-    """Containerize repository using S2I with enhanced detection"""
+async def _s2i_build_and_run_on_host(host, s2i: S2IBuilder, source_path: str, builder_image: str,
+                                    output_image: str, run_container: bool = True) -> Dict[str, Any]:
+    """Build with S2I and start the container on one docker host chosen by the build scheduler"""
+    reclaimer = get_reclaimer()
+    
+    # Build with S2I
+    result = await s2i.build_with_s2i(source_path, builder_image, output_image, env=host.env,
+                                      group=f"build:{host.name}")
+    
+    if result.get("success"):
+        await reclaimer.track_image(output_image, host.docker_host)
+    
+    if result.get("success") and run_container:
+        # Run the container
+        try:
+            run_cmd = host.docker("run", "-d", "--label", MANAGED_LABEL, *container_run_args(), "-p", "8080:8080", output_image)
+            with span("docker_run"):
+                run_result = await run_command(run_cmd, timeout=DOCKER_CLI_TIMEOUT, group="docker", env=host.env)
+            
+            if run_result.ok:
+                result["container_id"] = run_result.stdout.strip()
+                reclaimer.track_container(result["container_id"], output_image, host.docker_host)
+                result["message"] = f"S2I build successful. Container running on port 8080"
+            else:
+                result["run_error"] = run_result.stderr
+        except Exception as e:
+            result["run_error"] = str(e)
+    
+    return result
+
+async def containerize_with_s2i(source_path: str = "cloned_repos", builder_image: str = None, output_image: str = "my-app",
+                                run_container: bool = True) -> Dict[str, Any]:
+    """Containerize repository using S2I with enhanced detection; run_container=False only builds"""
     from s2i_setup import check_s2i_installation
+    from awsbedrock import check_docker_daemon
+    
+    scheduler = get_build_scheduler()
     
     # Check Docker daemon first
-    try:
-        docker_check = subprocess.run(["docker", "info"], capture_output=True, text=True, timeout=5)
-        if docker_check.returncode != 0:
+    with span("docker_check"):
+        if scheduler.local_only:
+            docker_check = await check_docker_daemon()
+        elif await scheduler.any_healthy():
+            docker_check = {"running": True}
+        else:
+            return {"error": "No healthy docker endpoint available", "docker_hosts": scheduler.status()}
+    if not docker_check.get("running"):
+        if docker_check.get("error") in ("Docker not installed", "Docker daemon timeout"):
             return {
-                "error": "Docker daemon not running",
-                "suggestion": "Start Docker Desktop before using S2I"
+                "error": "Docker not available",
+                "suggestion": "Install and start Docker Desktop"
             }
-    except (subprocess.TimeoutExpired, FileNotFoundError):
         return {
-            "error": "Docker not available",
-            "suggestion": "Install and start Docker Desktop"
+            "error": "Docker daemon not running",
+            "suggestion": "Start Docker Desktop before using S2I"
         }
     
     # Check S2I availability
-    s2i_check = check_s2i_installation()
+    s2i_check = await check_s2i_installation()
     if not s2i_check.get("installed"):
         return {
             "error": "S2I not found",
@@ -94,33 +162,32 @@ def containerize_with_s2i(source_path: str = "cloned_repos", builder_image: str
     if not os.path.exists(abs_source_path):
         return {"error": f"Source directory '{source_path}' not found"}
     
-    # Initialize S2I builder
-    s2i = S2IBuilder()
+    # Initialize S2I builder with the command found above
+    s2i = S2IBuilder(s2i_check.get("path", "s2i"))
     
     # Auto-detect project type and suggest builder
     if not builder_image:
-        if os.path.exists(os.path.join(abs_source_path, "requirements.txt")):
-            builder_image = "registry.redhat.io/ubi9/python-311"
-        elif os.path.exists(os.path.join(abs_source_path, "package.json")):
-            builder_image = "registry.redhat.io/ubi9/nodejs-18"
-        else:
+        builder_image = detect_builder_image(abs_source_path)
+        if not builder_image:
+            from monorepo import discover_services
+            services = await asyncio.to_thread(discover_services, abs_source_path)
+            if services:
+                return {
+                    "error": "Could not auto-detect project type at the repository root",
+                    "services": [service["path"] for service in services],
+                    "suggestion": "Use /containerize-services to build each service"
+                }
             return {"error": "Could not auto-detect project type. Please specify builder_image"}
     
-    # Build with S2I
-    result = s2i.build_with_s2i(abs_source_path, builder_image, output_image)
-    
-    if result.get("success"):
-        # Run the container
-        try:
-            run_cmd = ["docker", "run", "-d", "-p", "8080:8080", output_image]
-            run_result = subprocess.run(run_cmd, capture_output=True, text=True)
-            
-            if run_result.returncode == 0:
-                result["container_id"] = run_result.stdout.strip()
-                result["message"] = f"S2I build successful. Container running on port 8080"
-            else:
-                result["run_error"] = run_result.stderr
-        except Exception as e:
-            result["run_error"] = str(e)
-    
-    return result
\ No newline at end of file
+    with get_reclaimer().in_use(workspaces=[abs_source_path], images=[output_image]):
+        # Keep VCS data, dependency trees and caches out of the source s2i tars up
+        with span("prune_context"):
+            build_context = await asyncio.to_thread(prune_build_context, abs_source_path)
+        # Place the build on the least loaded host, preferring one that has the builder image
+        result = await scheduler.run(
+            lambda host: _s2i_build_and_run_on_host(host, s2i, abs_source_path, builder_image, output_image, run_container),
+            image=builder_image,
+            produced_images=[output_image]
+        )
+        result["build_context"] = build_context
+        return result
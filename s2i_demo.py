@@ -3,16 +3,17 @@
 S2I Demo Script - Containerize your repository using Source-to-Image
 """
 
+import asyncio
 from awsbedrock import setup_s2i_environment, containerize_project_with_s2i
 from s2i_builder import S2IBuilder
 
-def main():
+async def main():
     print("🚀 S2I Containerization Demo")
     print("=" * 40)
     
     # Step 1: Setup S2I environment
     print("\n1. Checking S2I environment...")
-    setup_result = setup_s2i_environment()
+    setup_result = await setup_s2i_environment()
     
     if setup_result["status"] == "ready":
         print(f"✅ S2I is ready: {setup_result['version']}")
@@ -34,7 +35,7 @@ def main():
     print("\n3. Containerizing Flask application...")
     
     # Use Python 3.11 builder for the Flask app
-    result = containerize_project_with_s2i(
+    result = await containerize_project_with_s2i(
         source_path="cloned_repos",
         builder_image="registry.redhat.io/ubi9/python-311",
         output_image="flask-app-s2i"
@@ -60,4 +61,4 @@ def main():
     print("  ✅ Language-specific optimizations")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -1,36 +1,43 @@
 import os
-import subprocess
 import platform
 import shutil
+import time
 from typing import Dict, Any
+from command_runner import run_command
 
-def install_s2i() -> Dict[str, Any]:
+# A successful detection is reused for S2I_CHECK_TTL seconds, so an S2I removed
+# or upgraded later is noticed; a missing S2I is re-probed on every call
+S2I_CHECK_TTL = float(os.getenv("S2I_CHECK_TTL", "300"))
+_s2i_check_cache = {"result": None, "checked_at": 0.0}
+
+async def install_s2i() -> Dict[str, Any]:
     """Install S2I based on the operating system"""
     system = platform.system().lower()
     
     try:
         if system == "windows":
-            return install_s2i_windows()
+            return await install_s2i_windows()
         elif system == "linux":
-            return install_s2i_linux()
+            return await install_s2i_linux()
         elif system == "darwin":  # macOS
-            return install_s2i_macos()
+            return await install_s2i_macos()
         else:
             return {"error": f"Unsupported operating system: {system}"}
     except Exception as e:
         return {"error": f"Installation failed: {str(e)}"}
 
-def install_s2i_windows() -> Dict[str, Any]:
+async def install_s2i_windows() -> Dict[str, Any]:
     """Install S2I on Windows"""
     # Check if chocolatey is available
     try:
-        subprocess.run(['choco', '--version'], capture_output=True, check=True)
+        choco_check = await run_command(['choco', '--version'], timeout=30)
+        if not choco_check.ok:
+            return manual_install_windows()
         
         # Install using chocolatey
-        result = subprocess.run(['choco', 'install', 'source-to-image', '-y'], 
-                              capture_output=True, text=True)
+        result = await run_command(['choco', 'install', 'source-to-image', '-y'], timeout=600)
         
-        if result.returncode == 0:
+        if result.ok:
             return {"success": True, "method": "chocolatey", "output": result.stdout}
         else:
             return manual_install_windows()
@@ -52,7 +59,7 @@ def manual_install_windows() -> Dict[str, Any]:
     """
     return {"manual_install": True, "instructions": instructions}
 
-def install_s2i_linux() -> Dict[str, Any]:
+async def install_s2i_linux() -> Dict[str, Any]:
     """Install S2I on Linux"""
     try:
         # Try using package manager first
@@ -63,8 +70,8 @@ def install_s2i_linux() -> Dict[str, Any]:
         
         for cmd in distro_commands:
             try:
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-                if result.returncode == 0:
+                result = await run_command(cmd, timeout=60)
+                if result.ok:
                     return {"success": True, "method": "package_manager", "output": result.stdout}
             except:
                 continue
@@ -90,14 +97,13 @@ def manual_install_linux() -> Dict[str, Any]:
     """
     return {"manual_install": True, "instructions": instructions}
 
-def install_s2i_macos() -> Dict[str, Any]:
+async def install_s2i_macos() -> Dict[str, Any]:
     """Install S2I on macOS"""
     try:
         # Try homebrew first
-        result = subprocess.run(['brew', 'install', 'source-to-image'], 
-                              capture_output=True, text=True)
+        result = await run_command(['brew', 'install', 'source-to-image'], timeout=600)
         
-        if result.returncode == 0:
+        if result.ok:
             return {"success": True, "method": "homebrew", "output": result.stdout}
         else:
             return manual_install_macos()
@@ -119,19 +125,27 @@ def manual_install_macos() -> Dict[str, Any]:
     """
     return {"manual_install": True, "instructions": instructions}
 
-def check_s2i_installation() -> Dict[str, Any]:
+async def check_s2i_installation(refresh: bool = False) -> Dict[str, Any]:
     """Check if S2I is properly installed with enhanced Windows detection"""
-    import shutil
-    
+    cached = _s2i_check_cache["result"]
+    if not refresh and cached and time.monotonic() - _s2i_check_cache["checked_at"] < S2I_CHECK_TTL:
+        return dict(cached)
+    result = await _probe_s2i_installation()
+    if result.get("installed"):
+        _s2i_check_cache["result"] = dict(result)
+        _s2i_check_cache["checked_at"] = time.monotonic()
+    else:
+        _s2i_check_cache["result"] = None
+    return result
+
+async def _probe_s2i_installation() -> Dict[str, Any]:
+    """Look for the S2I binary on PATH and in common install locations"""
     # Try standard PATH lookup first
     s2i_path = shutil.which('s2i')
     if s2i_path:
-        try:
-            result = subprocess.run([s2i_path, 'version'], capture_output=True, text=True, timeout=10)
-            if result.returncode == 0:
-                return {"installed": True, "version": result.stdout.strip(), "path": s2i_path}
-        except subprocess.TimeoutExpired:
-            pass
+        result = await run_command([s2i_path, 'version'], timeout=10)
+        if result.ok:
+            return {"installed": True, "version": result.stdout.strip(), "path": s2i_path}
     
     # Windows-specific paths to check
     if platform.system().lower() == "windows":
@@ -146,23 +160,20 @@ def check_s2i_installation() -> Dict[str, Any]:
         
         for path in windows_paths:
             if os.path.exists(path):
-                try:
-                    result = subprocess.run([path, 'version'], capture_output=True, text=True, timeout=10)
-                    if result.returncode == 0:
-                        return {
-                            "installed": True, 
-                            "version": result.stdout.strip(),
-                            "path": path,
-                            "note": "Found S2I but not in PATH. Consider adding to PATH."
-                        }
-                except subprocess.TimeoutExpired:
-                    continue
+                result = await run_command([path, 'version'], timeout=10)
+                if result.ok:
+                    return {
+                        "installed": True, 
+                        "version": result.stdout.strip(),
+                        "path": path,
+                        "note": "Found S2I but not in PATH. Consider adding to PATH."
+                    }
     
     return {"installed": False, "error": "S2I not found in PATH or common locations"}
 
-def get_s2i_command() -> str:
+async def get_s2i_command() -> str:
     """Get S2I command path"""
-    check_result = check_s2i_installation()
+    check_result = await check_s2i_installation()
     if check_result.get("installed"):
         return check_result.get("path", "s2i")
     return None
\ No newline at end of file
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Smoke check - runs the build scheduler and the push webhook end to end
+against fake_docker.sh, so no docker daemon, S2I or AWS account is needed.
+
+Checks that:
+  - a build lands on a reachable endpoint and never on one that is down
+  - a build whose daemon goes away is moved to another endpoint
+  - a signed push of a file:// repository is prebuilt and listed by
+    /prebuilds; without S2I installed the image fails with "S2I not found"
+
+Usage:
+    python smoke_check.py [--timeout 120]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WEBHOOK_SECRET = "smoke-check-secret"
+ENDPOINTS = ["tcp://a", "tcp://b", "tcp://dead"]
+
+def configure(work_dir: str):
+    """Point the service at the fake docker CLI and keep its state in work_dir.
+
+    Must run before the service modules are imported, since they read their
+    settings at import time.
+    """
+    os.environ.update({
+        "DOCKER_BIN": os.path.join(HERE, "fake_docker.sh"),
+        "DOCKER_ENDPOINTS": ",".join(ENDPOINTS),
+        "FAKE_DOCKER_DOWN": "dead",
+        "FAKE_DOCKER_BUILD_SECONDS": "0",
+        "WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "PREWARM": "0",
+        "PREBUILD_IDLE_POLL": "0.1",
+        "AWS_EC2_METADATA_DISABLED": "true",
+        "LOG_STORE_DIR": os.path.join(work_dir, "build_logs"),
+        "BUILD_CACHE_DIR": os.path.join(work_dir, "build_cache"),
+        "SERVICE_STATE_DIR": os.path.join(work_dir, "service_state"),
+        "PREBUILD_DIR": os.path.join(work_dir, "prebuild_workspaces"),
+        "PROFILE_DIR": os.path.join(work_dir, "profiles")
+    })
+
+failures = []
+
+def check(label: str, ok: bool, detail=None):
+    print(f"{'ok  ' if ok else 'FAIL'} {label}" + ("" if ok or detail is None else f": {detail}"))
+    if not ok:
+        failures.append(label)
+
+async def check_scheduler():
+    from build_scheduler import BuildScheduler, is_host_failure
+    from command_runner import run_command
+
+    async def build(host):
+        result = await run_command(host.docker("build", "-t", "smoke-app", "."), group=f"build:{host.name}", env=host.env)
+        return {"success": result.ok, "error": result.stderr.strip(), "host_failure": is_host_failure(result)}
+
+    scheduler = BuildScheduler(ENDPOINTS)
+    hosts = {host.name: host for host in scheduler.hosts}
+
+    first = await scheduler.run(build, image="python:3.11")
+    check("build succeeds on a reachable endpoint", first.get("success"), first)
+    check("unreachable endpoint is marked unhealthy", hosts["tcp://dead"].healthy is False, scheduler.status())
+    used = first.get("docker_host")
+
+    # The endpoint that built the image is preferred next time; take it down
+    # after its health was cached so the build itself hits the dead daemon
+    os.environ["FAKE_DOCKER_DOWN"] = used or "dead"
+    try:
+        second = await scheduler.run(build, image="python:3.11")
+    finally:
+        os.environ["FAKE_DOCKER_DOWN"] = "dead"
+    check("build fails over to another endpoint", second.get("success") and second.get("docker_host") not in (used, "tcp://dead"), second)
+    check("failed endpoint is marked unhealthy", used in hosts and hosts[used].healthy is False, scheduler.status())
+    check("no build slots are left reserved", not any(host.active_builds for host in scheduler.hosts), scheduler.status())
+
+def git(*args: str, cwd: str = None) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=smoke", "-c", "user.email=smoke@example.com", *args],
+        cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+def make_repository(work_dir: str) -> tuple:
+    """A bare repository with one Python commit on main; returns its file:// URL and the commit"""
+    bare = os.path.join(work_dir, "smoke-app.git")
+    source = os.path.join(work_dir, "smoke-app")
+    git("init", "-q", "--bare", bare)
+    git("init", "-q", source)
+    with open(os.path.join(source, "requirements.txt"), "w") as f:
+        f.write("flask\n")
+    with open(os.path.join(source, "app.py"), "w") as f:
+        f.write("print('hello')\n")
+    git("add", ".", cwd=source)
+    git("commit", "-q", "-m", "Initial commit", cwd=source)
+    git("push", "-q", bare, "HEAD:refs/heads/main", cwd=source)
+    return f"file://{bare}", git("rev-parse", "HEAD", cwd=source)
+
+def check_webhook(work_dir: str, timeout: float):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    repo_url, commit = make_repository(work_dir)
+    body = json.dumps({"ref": "refs/heads/main", "after": commit, "repository": {"clone_url": repo_url}}).encode()
+    signature = "sha256=" + hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    headers = {"Content-Type": "application/json", "X-GitHub-Event": "push"}
+
+    with TestClient(app) as client:
+        response = client.post("/webhooks/push", content=body, headers=dict(headers, **{"X-Hub-Signature-256": "sha256=0"}))
+        check("push with a bad signature is rejected", response.status_code == 401, response.text)
+
+        response = client.post("/webhooks/push", content=body, headers=dict(headers, **{"X-Hub-Signature-256": signature}))
+        check("signed push is queued", response.status_code == 200 and response.json().get("queued"), response.text)
+
+        entry = None
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            prebuilds = client.get("/prebuilds").json()["prebuilds"]
+            entry = next((item for item in prebuilds if item["commit"] == commit), None)
+            if entry and entry["status"] not in ("running", "queued"):
+                break
+            time.sleep(0.2)
+
+    check("/prebuilds lists the pushed commit", entry is not None and entry["repo_url"] == repo_url, entry)
+    if entry is None:
+        return
+    check("prebuild finished", entry["status"] in ("ready", "failed"), entry)
+    check("prebuild cloned the repository", bool(entry.get("clone_log_id")) and "Clone failed" not in entry.get("error", ""), entry)
+    if shutil.which("s2i"):
+        check("S2I image was built", "image" in entry, entry.get("image_error"))
+    else:
+        check("image fails with 'S2I not found'", entry.get("image_error") == "S2I not found", entry.get("image_error"))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for the prebuild")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="smoke-check-")
+    configure(work_dir)
+    # main.py loads its templates relative to the working directory
+    os.chdir(HERE)
+    sys.path.insert(0, HERE)
+    try:
+        asyncio.run(check_scheduler())
+        check_webhook(work_dir, args.timeout)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if failures:
+        print(f"\n{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("\nAll checks passed")
+
+if __name__ == "__main__":
+    main()
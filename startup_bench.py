@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark - measures cold import time of main.py and time until the
+ASGI app answers /health, so regressions in cold-start latency are caught
+before they reach autoscaled deployments.
+
+Usage:
+    python startup_bench.py [--runs 5] [--port 8765] [--max-import-ms 500] [--max-ready-ms 2000]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+def measure_import(runs: int) -> list:
+    """Time `import main` in a fresh interpreter, in milliseconds"""
+    code = "import time; t = time.perf_counter(); import main; print((time.perf_counter() - t) * 1000)"
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing main failed: {result.stderr}")
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return samples
+
+def measure_ready(runs: int, port: int, timeout: float = 30.0) -> list:
+    """Time from process launch until /health returns 200, in milliseconds"""
+    env = dict(os.environ, PREWARM=os.getenv("PREWARM", "0"))
+    url = f"http://127.0.0.1:{port}/health"
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=env
+        )
+        try:
+            while True:
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError("Server did not become healthy in time")
+                try:
+                    with urllib.request.urlopen(url, timeout=1) as response:
+                        if response.status == 200:
+                            break
+                except OSError:
+                    time.sleep(0.01)
+            samples.append((time.perf_counter() - started) * 1000)
+        finally:
+            proc.terminate()
+            proc.wait()
+    return samples
+
+def report(label: str, samples: list) -> float:
+    median = statistics.median(samples)
+    print(f"{label}: median {median:.1f} ms, min {min(samples):.1f} ms, max {max(samples):.1f} ms ({len(samples)} runs)")
+    return median
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure service cold-start time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-ready-ms", type=float, default=None)
+    parser.add_argument("--skip-server", action="store_true", help="Only measure import time")
+    args = parser.parse_args()
+
+    print("⏱️  Startup benchmark")
+    print("=" * 40)
+
+    failed = False
+    import_median = report("import main", measure_import(args.runs))
+    if args.max_import_ms is not None and import_median > args.max_import_ms:
+        print(f"❌ import time above budget of {args.max_import_ms} ms")
+        failed = True
+
+    if not args.skip_server:
+        ready_median = report("time to /health", measure_ready(args.runs, args.port))
+        if args.max_ready_ms is not None and ready_median > args.max_ready_ms:
+            print(f"❌ time to ready above budget of {args.max_ready_ms} ms")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
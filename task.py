@@ -2,14 +2,25 @@ import boto3
 import json
 from botocore.exceptions import ClientError
 
-def query_amazon_q(prompt: str) -> dict:
+# Amazon Q conversation per repository workspace: {workspace: (conversation_id, last system message id)}
+_q_conversations = {}
+
+def query_amazon_q(prompt: str, workspace: str = None) -> dict:
     """
-    Send prompt to Amazon Q and return JSON response
+    Send prompt to Amazon Q and return JSON response.
+    Prompts for the same workspace continue one conversation, so follow-up
+    questions do not need to repeat the repository context.
     """
     try:
         # Initialize Amazon Q client
         client = boto3.client('qbusiness')
         
+        # Continue the workspace's conversation if there is one
+        conversation = {}
+        if workspace in _q_conversations:
+            conversation_id, parent_message_id = _q_conversations[workspace]
+            conversation = {'conversationId': conversation_id, 'parentMessageId': parent_message_id}
+        
         # Send message to Amazon Q
         response = client.chat_sync(
             applicationId='your-application-id',  # Replace with your Q application ID
@@ -21,16 +32,18 @@ def query_amazon_q(prompt: str) -> dict:
             },
             'text': prompt
         },
-            conversationId=None  # New conversation
+            **conversation
         )
         
-
+        if workspace is not None:
+            _q_conversations[workspace] = (response.get('conversationId'), response.get('systemMessageId'))
 
         # Return structured JSON response
         return {
             "success": True,
             "response": response.get('systemMessage', ''),
             "conversation_id": response.get('conversationId', ''),
+            "continued": bool(conversation),
             "source_attributions": response.get('sourceAttributions', [])
         }
         